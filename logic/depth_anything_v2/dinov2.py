@@ -102,6 +102,7 @@ class DinoVisionTransformer(nn.Module):
         self.num_register_tokens = num_register_tokens
         self.interpolate_antialias = interpolate_antialias
         self.interpolate_offset = interpolate_offset
+        self.pos_embed_cache = None  # (key, pos_embed) of the last interpolation, reused at inference
 
         self.patch_embed = embed_layer(img_size=img_size, patch_size=patch_size, in_chans=in_chans, embed_dim=embed_dim)
         num_patches = self.patch_embed.num_patches
@@ -116,7 +117,7 @@ class DinoVisionTransformer(nn.Module):
         if drop_path_uniform is True:
             dpr = [drop_path_rate] * depth
         else:
-            dpr = [x.item() for x in torch.linspace(0, drop_path_rate, depth)]  # stochastic depth decay rule
+            dpr = torch.linspace(0, drop_path_rate, depth, device="cpu").tolist()  # stochastic depth decay rule (on the CPU, so the model can be built on the meta device)
 
         if ffn_layer == "mlp":
             logger.info("using MLP layer as FFN")
@@ -170,6 +171,8 @@ class DinoVisionTransformer(nn.Module):
         self.init_weights()
 
     def init_weights(self):
+        if self.pos_embed.is_meta:
+            return  # Built on the meta device to load a checkpoint into: nothing to initialize
         trunc_normal_(self.pos_embed, std=0.02)
         nn.init.normal_(self.cls_token, std=1e-6)
         if self.register_tokens is not None:
@@ -182,6 +185,18 @@ class DinoVisionTransformer(nn.Module):
         N = self.pos_embed.shape[1] - 1
         if npatch == N and w == h:
             return self.pos_embed
+        # Frames of a video all have the same size, so at inference the interpolated
+        # encoding is computed once and reused (the key changes if the weights are reloaded)
+        cacheable = not self.training and not torch.is_grad_enabled()
+        key = (w, h, previous_dtype, x.device, self.pos_embed.data_ptr(), self.pos_embed._version)
+        if cacheable and self.pos_embed_cache is not None and self.pos_embed_cache[0] == key:
+            return self.pos_embed_cache[1]
+        pos_embed = self._interpolate_pos_encoding(x, w, h, N).to(previous_dtype)
+        if cacheable:
+            self.pos_embed_cache = (key, pos_embed)
+        return pos_embed
+
+    def _interpolate_pos_encoding(self, x, w, h, N):
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
         patch_pos_embed = pos_embed[:, 1:]
@@ -207,7 +222,7 @@ class DinoVisionTransformer(nn.Module):
         assert int(w0) == patch_pos_embed.shape[-2]
         assert int(h0) == patch_pos_embed.shape[-1]
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
-        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(previous_dtype)
+        return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1)
 
     def prepare_tokens_with_masks(self, x, masks=None):
         B, nc, w, h = x.shape
@@ -1,12 +1,29 @@
+import warnings
+
 import cv2
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torchvision.transforms import Compose
 
 from .dinov2 import DINOv2
 from .util.blocks import FeatureFusionBlock, _make_scratch
-from .util.transform import Resize, NormalizeImage, PrepareForNet
+from .util.transform import Resize
+
+
+# Inference precisions for DepthAnythingV2.set_precision
+PRECISIONS = ('fp32', 'bf16', 'int8')
+
+
+def quantize_linear_layers(module):
+    """
+    A copy of `module` with its nn.Linear layers dynamically quantized to int8:
+    int8 weights, activations quantized on the fly per batch (CPU only).
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization warns that it will move to torchao; the dynamic path still works
+        warnings.simplefilter('ignore')
+        return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
 
 
 def _make_fusion_block(features, use_bn, size=None):
@@ -172,8 +189,40 @@ class DepthAnythingV2(nn.Module):
         self.pretrained = DINOv2(model_name=encoder)
         
         self.depth_head = DPTHead(self.pretrained.embed_dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
+        
+        self.precision = 'fp32'
+        self.float_blocks = None  # The DINOv2 blocks as they were before int8 quantization
+    
+    def set_precision(self, precision):
+        """
+        Selects the inference precision.
+        
+        Args:
+            precision (str): 'fp32' (default); 'bf16' (bfloat16 autocast, fast on GPUs and on
+                CPUs with AVX512-BF16/AMX); or 'int8' (dynamic int8 quantization of the Linear
+                layers in the DINOv2 blocks: attention qkv/proj and MLP; CPU only).
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose from: {', '.join(PRECISIONS)}")
+        if precision == self.precision:
+            return
+        if precision == 'int8':
+            if self.pretrained.patch_embed.proj.weight.device.type != 'cpu':
+                raise RuntimeError("int8 quantization only runs on the CPU.")
+            self.float_blocks = self.pretrained.blocks
+            self.pretrained.blocks = quantize_linear_layers(self.float_blocks)
+        elif self.float_blocks is not None:
+            self.pretrained.blocks = self.float_blocks
+            self.float_blocks = None
+        self.precision = precision
     
     def forward(self, x):
+        if self.precision == 'bf16':
+            with torch.autocast(device_type=x.device.type, dtype=torch.bfloat16):
+                return self.forward_features(x).float()
+        return self.forward_features(x)
+    
+    def forward_features(self, x):
         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
         
         features = self.pretrained.get_intermediate_layers(x, self.intermediate_layer_idx[self.encoder], return_class_token=True)
@@ -189,33 +238,95 @@ class DepthAnythingV2(nn.Module):
         
         depth = self.forward(image)
         
-        depth = F.interpolate(depth[:, None], (h, w), mode="bilinear", align_corners=True)[0, 0]
+        return self.upsample_depth(depth, (h, w))[0]
+    
+    @torch.no_grad()
+    def infer_batch(self, raw_images, input_size=518):
+        """
+        Batched `infer_image` for frames of the same shape (e.g. from one video file):
+        one forward pass for all of them.
         
+        Args:
+            raw_images (list): BGR frames, all with the same shape.
+            input_size (int): The network input resolution (multiple of 14).
+        Returns:
+            numpy.ndarray: (N, h, w) depth maps at the frames' resolution.
+        """
+        h, w = raw_images[0].shape[:2]
+        return self.upsample_depth(self.infer_low_res(raw_images, input_size), (h, w))
+    
+    @torch.no_grad()
+    def infer_low_res(self, raw_images, input_size=518):
+        """
+        Runs the network on same-shaped BGR frames and returns its (N, H', W') output
+        as a tensor on the device, at network resolution. Query it with
+        `sample_depth` or turn it into full maps with `upsample_depth`.
+        """
+        batch = np.stack([self.resize_for_net(raw_image, input_size) for raw_image in raw_images])
+        return self.forward(self.normalize_on_device(batch))
+    
+    @staticmethod
+    def upsample_depth(depth, size):
+        """(N, H', W') network output -> (N, h, w) NumPy depth maps at the frame size."""
+        depth = F.interpolate(depth[:, None], size, mode="bilinear", align_corners=True)[:, 0]
         return depth.cpu().numpy()
     
-    def image2tensor(self, raw_image, input_size=518):        
-        transform = Compose([
-            Resize(
-                width=input_size,
-                height=input_size,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
-            NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            PrepareForNet(),
-        ])
+    @staticmethod
+    def sample_depth(depth, points, size):
+        """
+        Depth at normalized (x, y) frame positions, read straight from the network output.
         
+        Gives the same values as looking the pixels up in the `upsample_depth` map
+        (bilinear, align_corners=True), without building or copying the full map.
+        
+        Args:
+            depth (torch.Tensor): (N, H', W') network output.
+            points: (N, P, 2) normalized (x, y) positions, one set per image.
+            size (tuple): (h, w) of the original frames.
+        Returns:
+            numpy.ndarray: (N, P) depth values.
+        """
+        h, w = size
+        points = torch.as_tensor(np.asarray(points, dtype=np.float32), device=depth.device)
+        # The same pixel the full-size lookup would read...
+        x = (points[..., 0] * w).trunc().clamp(0, w - 1)
+        y = (points[..., 1] * h).trunc().clamp(0, h - 1)
+        # ...expressed in grid_sample coordinates, where -1 and 1 are the corner pixels
+        grid = torch.stack((2 * x / max(w - 1, 1) - 1, 2 * y / max(h - 1, 1) - 1), dim=-1)
+        values = F.grid_sample(depth[:, None].float(), grid[:, None], mode='bilinear', align_corners=True)
+        return values[:, 0, 0].cpu().numpy()
+    
+    def image2tensor(self, raw_image, input_size=518):        
         h, w = raw_image.shape[:2]
         
-        image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
+        image = self.normalize_on_device(self.resize_for_net(raw_image, input_size)[None])
         
-        image = transform({'image': image})['image']
-        image = torch.from_numpy(image).unsqueeze(0)
+        return image, (h, w)
+    
+    def resize_for_net(self, raw_image, input_size=518):
+        """Resizes a BGR uint8 frame to the network size and converts it to RGB (still uint8)."""
+        resize = Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method='lower_bound',
+            image_interpolation_method=cv2.INTER_CUBIC,
+        )
         
-        DEVICE = 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
-        image = image.to(DEVICE)
+        h, w = raw_image.shape[:2]
         
-        return image, (h, w)
+        # Resize the uint8 frame first, so the color conversion and the float math
+        # only touch the network-sized image (not a full-resolution float64 copy)
+        width, height = resize.get_size(w, h)
+        image = cv2.resize(raw_image, (width, height), interpolation=cv2.INTER_CUBIC)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    def normalize_on_device(self, images):
+        """Uploads (N, H, W, 3) uint8 RGB images and normalizes them on the model's device."""
+        device = next(self.parameters()).device
+        images = torch.from_numpy(images).to(device).permute(0, 3, 1, 2).float()
+        mean = torch.tensor([0.485, 0.456, 0.406], device=device).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225], device=device).view(1, 3, 1, 1)
+        return (images / 255.0 - mean) / std
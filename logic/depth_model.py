@@ -0,0 +1,272 @@
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# torch and the Depth Anything modules are imported inside the functions below,
+# so the 2D modes never pay for them.
+
+# Model configurations for different encoders
+MODEL_CONFIGS = {
+    'vits': {'encoder': 'vits', 'features': 64, 'out_channels': [48, 96, 192, 384]},
+    'vitb': {'encoder': 'vitb', 'features': 128, 'out_channels': [96, 192, 384, 768]},
+    'vitl': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024]},
+    'vitg': {'encoder': 'vitg', 'features': 384, 'out_channels': [1536, 1536, 1536, 1536]}
+}
+
+MODEL_INFO = {
+    'vits': 'Small Model (Fastest, Lower Accuracy)',
+    'vitb': 'Base Model (Balanced Speed/Accuracy)',
+    'vitl': 'Large Model (Slower, Higher Accuracy)',
+    'vitg': 'Giant Model (Slowest, Highest Accuracy)'
+}
+
+
+def checkpoint_path(encoder):
+    """
+    The encoder's checkpoint: the .safetensors file if it was converted (see
+    tools/convert_checkpoint.py) and safetensors is installed, else the .pth file.
+    """
+    path = f'logic/checkpoints/depth_anything_v2_{encoder}.pth'
+    safetensors_path = os.path.splitext(path)[0] + '.safetensors'
+    if os.path.exists(safetensors_path) and importlib.util.find_spec('safetensors') is not None:
+        return safetensors_path
+    return path
+
+
+def load_state_dict(path):
+    """
+    Reads a checkpoint without copying it into memory: the tensors are mapped
+    from the file and only paged in when used.
+
+    Args:
+        path (str): A .safetensors file, or a .pth file saved by torch.save.
+    Returns:
+        dict: The state dict (CPU tensors).
+    """
+    import torch
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path, device='cpu')
+    try:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    except RuntimeError as e:
+        if 'zipfile' not in str(e):
+            raise
+        # Checkpoints in the old (pre torch 1.6) format can't be memory-mapped
+        return torch.load(path, map_location='cpu', weights_only=True)
+
+
+def select_device():
+    """CUDA > MPS > CPU."""
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'mps' if torch.backends.mps.is_available() else 'cpu'
+
+
+def load_depth_model(encoder, device, path=None, progress=None):
+    """
+    Builds a DepthAnythingV2 model and loads its checkpoint.
+
+    Args:
+        encoder (str): 'vits', 'vitb', 'vitl' or 'vitg'.
+        device (str): Device to move the model to.
+        path (str): Checkpoint file (default: logic/checkpoints/depth_anything_v2_<encoder>.pth).
+        progress (callable): Called with (message, percent) as the loading goes on.
+    Returns:
+        The model, on `device` and in evaluation mode.
+    """
+    if encoder not in MODEL_CONFIGS:
+        raise ValueError(f"Invalid model size '{encoder}'. Valid options: {list(MODEL_CONFIGS.keys())}")
+    progress = progress or (lambda message, percent: None)
+    path = path or checkpoint_path(encoder)
+
+    progress(f"Importing torch for the {encoder} depth model", 5)
+    import torch
+    from logic.depth_anything_v2.dpt import DepthAnythingV2
+
+    progress(f"Reading {path}", 20)
+    try:
+        state_dict = load_state_dict(path)
+    except FileNotFoundError:
+        raise RuntimeError(f"Checkpoint not found: {path}. Please make sure you have downloaded the {encoder} model weights.")
+
+    progress(f"Building the {encoder} depth model", 50)
+    # Built on the meta device (no memory, no random init); the checkpoint's
+    # tensors then become the parameters as they are (assign=True), without a copy
+    with torch.device('meta'):
+        model = DepthAnythingV2(**MODEL_CONFIGS[encoder])
+
+    progress(f"Loading the {encoder} weights", 70)
+    model.load_state_dict(state_dict, assign=True)
+
+    progress(f"Moving the {encoder} depth model to {device}", 85)
+    model = model.to(device).eval()
+    return model
+
+
+def model_memory(model):
+    """Bytes taken by a model's parameters and buffers, including int8 quantized weights."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        # Dynamically quantized Linear layers keep their weights packed, outside parameters()
+        if hasattr(module, '_packed_params') and callable(getattr(module, 'weight', None)):
+            tensors += [tensor for tensor in (module.weight(), module.bias()) if tensor is not None]
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelEntry:
+    """A loaded depth model with its load time and memory use."""
+
+    def __init__(self, encoder, model, load_seconds, memory_bytes):
+        self.encoder = encoder
+        self.model = model
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.uses = 0  # Times get() returned it
+
+
+class DepthModelRegistry:
+    """
+    Keeps recently used depth models loaded, so switching between variants
+    doesn't rebuild them and re-read their checkpoints.
+
+    `select()` makes a variant the active one. If it is already loaded the swap
+    is immediate; otherwise it loads on a background thread and `get()` keeps
+    returning the previous model until the new one is ready, so a running
+    capture never stops. When the loaded models take more than the memory
+    budget, the least recently used ones (never the active one) are dropped.
+    """
+
+    def __init__(self, memory_budget_mb=1536, device=None, progress=None):
+        """
+        Args:
+            memory_budget_mb (float): Memory the loaded models may take together.
+            device (str): Device for the models (None = pick on the first load).
+            progress (callable): Called with (message, percent) from the loading threads
+                (100 = ready, -1 = failed).
+        """
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.device = device
+        self.progress = progress or (lambda message, percent: None)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # encoder -> ModelEntry, least recently used first
+        self.active = None            # The ModelEntry get() returns
+        self.selected = None          # The encoder asked for last
+        self.loading = {}             # encoder -> threading.Event, set when its load ends
+        self.errors = {}              # encoder -> message of its failed load
+
+    def select(self, encoder, path=None):
+        """Makes `encoder` the active model, loading it in the background if needed. Returns at once."""
+        with self.lock:
+            self.selected = encoder
+            entry = self.entries.get(encoder)
+            if entry is not None:
+                self._activate(entry)
+                self.progress(f"{encoder} depth model ready", 100)
+                return
+            if encoder in self.loading:
+                return
+            self.errors.pop(encoder, None)
+            done = threading.Event()
+            self.loading[encoder] = done
+        threading.Thread(target=self._load, args=(encoder, path, done), name=f"depth-model-{encoder}", daemon=True).start()
+
+    def _activate(self, entry):
+        """Swaps the active model (lock held). The next get() returns it."""
+        self.entries.move_to_end(entry.encoder)
+        if self.active is not entry:
+            self.active = entry
+            print(f"Active model: {MODEL_INFO.get(entry.encoder, entry.encoder)}")
+
+    def _load(self, encoder, path, done):
+        try:
+            if self.device is None:
+                self.device = select_device()
+                print(f"Using device: {self.device}")
+            start_time = time.perf_counter()
+            model = load_depth_model(encoder, self.device, path, self.progress)
+            entry = ModelEntry(encoder, model, time.perf_counter() - start_time, model_memory(model))
+            print(f"Depth model {encoder} loaded in {entry.load_seconds:.1f} s ({entry.memory_bytes / 2**20:.0f} MB)")
+            with self.lock:
+                self.entries[encoder] = entry
+                if self.selected == encoder or self.active is None:
+                    self._activate(entry)
+                self._evict()
+            self.progress(f"{encoder} depth model ready", 100)
+        except Exception as e:
+            with self.lock:
+                self.errors[encoder] = str(e)
+                if self.selected == encoder and self.active is not None:
+                    # Stay on the model that is still in use rather than retrying on every get()
+                    self.selected = self.active.encoder
+            print(f"Failed to load depth model {encoder}: {e}")
+            self.progress(f"Failed to load the {encoder} depth model: {e}", -1)
+        finally:
+            with self.lock:
+                self.loading.pop(encoder, None)
+            done.set()
+
+    def set_memory_budget(self, memory_budget_mb):
+        """Changes the memory budget, dropping models right away if they no longer fit."""
+        with self.lock:
+            self.memory_budget = memory_budget_mb * 1024 * 1024
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used models until the budget is met (lock held)."""
+        evicted = False
+        while sum(entry.memory_bytes for entry in self.entries.values()) > self.memory_budget:
+            victim = next((entry for entry in self.entries.values()
+                           if entry is not self.active and entry.encoder != self.selected), None)
+            if victim is None:
+                break
+            del self.entries[victim.encoder]
+            evicted = True
+            print(f"Evicted the {victim.encoder} depth model ({victim.memory_bytes / 2**20:.0f} MB)")
+        if evicted and self.device == 'cuda':
+            import torch
+            torch.cuda.empty_cache()
+
+    def get(self):
+        """The active model. Waits if none is active yet but the selected one is loading."""
+        while True:
+            with self.lock:
+                if self.active is not None:
+                    self.active.uses += 1
+                    return self.active.model
+                if self.selected is None:
+                    raise RuntimeError("No depth model selected.")
+                if self.selected in self.errors:
+                    raise RuntimeError(self.errors[self.selected])
+                done = self.loading.get(self.selected)
+                encoder = self.selected
+            if done is None:
+                raise RuntimeError(f"The {encoder} depth model is not loaded.")
+            print(f"Waiting for the {encoder} depth model to load...")
+            done.wait()
+
+    def set_precision(self, model, precision):
+        """
+        Sets a loaded model's inference precision (see DepthAnythingV2.set_precision) and
+        updates its memory use: int8 adds the quantized blocks next to the float ones.
+        """
+        if model.precision == precision:
+            return
+        model.set_precision(precision)
+        with self.lock:
+            entry = next((entry for entry in self.entries.values() if entry.model is model), None)
+            if entry is not None:
+                entry.memory_bytes = model_memory(model)
+                self._evict()
+
+    def stats(self):
+        """Load time and memory use of every loaded model, least recently used first."""
+        with self.lock:
+            return [{
+                'encoder': entry.encoder,
+                'active': entry is self.active,
+                'load_seconds': round(entry.load_seconds, 2),
+                'memory_mb': round(entry.memory_bytes / 2**20, 1),
+                'uses': entry.uses,
+            } for entry in self.entries.values()]
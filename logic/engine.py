@@ -0,0 +1,156 @@
+import os
+import cv2
+import numpy as np
+from logic.pipeline import FramePipeline
+from logic.stages import FramePacket
+from logic.keypoint_io import create_keypoint_writer
+
+
+class ProcessingEngine:
+    """
+    The single processing loop used by every video, webcam and phone mode.
+
+    It reads frames from a FrameSource, runs them through a list of stages
+    (callables that take a FramePacket), then collects/broadcasts the keypoints
+    and writes/emits the frames. The three parts run as FramePipeline stages,
+    so reading, processing and writing overlap for every source.
+
+    Frames move through the pipeline in batches. Live sources always use
+    batches of one; for files, stages with a `process_batch(packets)` method
+    (e.g. the depth stage) get the whole batch at once, the others run per packet.
+    """
+
+    def __init__(self, source, stages, on_frame, video_filename=None, black_video_filename=None, keypoints_filename=None, server=None, on_idle=None, queue_size=4, batch_size=1, keypoints_format='json'):
+        """
+        Args:
+            source (FrameSource): Where the frames come from.
+            stages (list): Callables run in order on each FramePacket.
+            on_frame (callable): Receives the frame to display (e.g. a Qt signal's emit).
+            video_filename (str): Output video name in outputs/videos, or None to not save it.
+            black_video_filename (str): Output video name for the black background video, or None.
+            keypoints_filename (str): Keypoints file name in outputs/keypoints, or None to not save them.
+            server (KeypointServer or KeypointSession): Where to broadcast the keypoints, or None.
+            on_idle (callable): Called between frames on the processing thread.
+            queue_size (int): Capacity of the queues between the pipeline stages.
+            batch_size (int): Frames per batch for offline sources (ignored for live sources).
+            keypoints_format (str): 'json' (array), 'jsonl' or 'npy' (binary); the keypoints are streamed to the file as they arrive.
+        """
+        self.source = source
+        self.stages = stages
+        self.on_frame = on_frame
+        self.video_filename = video_filename
+        self.black_video_filename = black_video_filename
+        self.keypoints_filename = keypoints_filename
+        self.keypoints_format = keypoints_format
+        self.server = server
+        self.on_idle = on_idle
+        self.queue_size = queue_size
+        self.batch_size = 1 if source.is_live else max(1, batch_size)
+
+        self.writer = None
+        self.writer_black = None
+        self.keypoint_writer = None
+        self.pipeline = None
+
+    # ===== Pipeline stages =====
+    def _read(self):
+        packets = []
+        while len(packets) < self.batch_size:
+            item = self.source.read()
+            if item is None:
+                break
+            frame, timestamp = item
+            packets.append(FramePacket(frame, timestamp))
+        return packets or None
+
+    def _process(self, packets):
+        for stage in self.stages:
+            if hasattr(stage, 'process_batch'):
+                stage.process_batch(packets)
+            else:
+                for packet in packets:
+                    stage(packet)
+
+        if self.server:
+            for packet in packets:
+                if packet.keypoints is not None:
+                    self.server.broadcast(packet.keypoints, packet.timestamp)
+        return packets
+
+    def _output(self, packets):
+        for packet in packets:
+            # Saving happens here, on the output thread, to keep the JSON encoding off the processing thread
+            if self.keypoint_writer and packet.keypoints is not None:
+                keypoints = packet.keypoints if self.keypoint_writer.binary else packet.keypoints.to_dict()
+                self.keypoint_writer.write(keypoints, packet.timestamp)
+            self._output_packet(packet)
+
+    def _output_packet(self, packet):
+        if packet.depth_frame is not None:
+            self.on_frame(packet.depth_frame)
+        elif self.video_filename:
+            self.on_frame(packet.display_frame)
+        elif self.black_video_filename and packet.black_frame is not None:
+            self.on_frame(packet.black_frame)
+        else:
+            self.on_frame(packet.display_frame)
+
+        if self.video_filename:
+            if self.writer is None:
+                self.writer = init_writer(self.video_filename, self.source.fps(), packet.display_frame)
+            self.writer.write(packet.display_frame)
+        if self.black_video_filename:
+            black_frame = packet.black_frame if packet.black_frame is not None else np.zeros_like(packet.display_frame)
+            if self.writer_black is None:
+                self.writer_black = init_writer(self.black_video_filename, self.source.fps(), black_frame)
+            self.writer_black.write(black_frame)
+
+    # ===== Control =====
+    def run(self):
+        """Processes the source until it ends or `stop()` is called, then saves the outputs."""
+        try:
+            self.source.open()
+            if self.keypoints_filename:
+                self.keypoint_writer = create_keypoint_writer(self.keypoints_filename, self.keypoints_format)
+            # Live sources hand over only their newest frame; offline files are processed completely
+            self.pipeline = FramePipeline(self._read, self._process, self._output, queue_size=self.queue_size, on_idle=self.on_idle, latest_only=self.source.is_live)
+            self.pipeline.run()
+            self.report_dropped_frames()
+        finally:
+            self.source.release()
+            if self.keypoint_writer:
+                # Also on errors: everything processed so far stays in a valid file
+                self.keypoint_writer.close()
+                print(f"Video landmarks saved to {self.keypoint_writer.path}")
+            if self.writer:
+                self.writer.release()
+                print(f"Video saved to {self.video_filename}")
+            if self.writer_black:
+                self.writer_black.release()
+                print(f"Video with black background saved to {self.black_video_filename}")
+
+    def dropped_frames(self):
+        """Frames a live source captured but the processing skipped to stay on the newest frame."""
+        dropped = self.pipeline.dropped_frames if self.pipeline else 0
+        if hasattr(self.source, 'dropped_frames'):
+            dropped += self.source.dropped_frames()
+        return dropped
+
+    def report_dropped_frames(self):
+        if self.source.is_live:
+            print(f"Skipped {self.dropped_frames()} stale frames to keep the latency bounded.")
+
+    def stop(self):
+        """Stops the pipeline and interrupts a source that is waiting for a frame. Safe from any thread."""
+        self.source.stop()
+        if self.pipeline:
+            self.pipeline.stop()
+
+
+# ===== Init video writer =====
+def init_writer(video_filename, fps, frame):
+    """Creates an mp4 writer in outputs/videos sized to the given frame."""
+    video_path = os.path.join('outputs', 'videos', video_filename)
+    frame_height, frame_width = frame.shape[:2]
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(video_path, fourcc, fps, (frame_width, frame_height))
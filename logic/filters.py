@@ -0,0 +1,189 @@
+import inspect
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of the last `size` values (floats or same-shaped arrays).
+    Memory stays constant no matter how many values are appended.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.data = None   # Allocated on the first append, once the value shape is known
+        self.index = 0     # Where the next value goes
+        self.count = 0     # Number of valid values (at most `size`)
+
+    def append(self, value):
+        """Stores `value` and returns the value it overwrote (None while the buffer is not full)."""
+        value = np.asarray(value, dtype=np.float64)
+        if self.data is None:
+            self.data = np.zeros((self.size,) + value.shape, dtype=np.float64)
+        overwritten = self.data[self.index].copy() if self.count == self.size else None
+        self.data[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return overwritten
+
+    def values(self):
+        """The stored values, oldest first."""
+        if self.data is None:
+            return np.zeros((0,))
+        if self.count < self.size:
+            return self.data[:self.count]
+        return np.roll(self.data, -self.index, axis=0)
+
+    def full(self):
+        return self.count == self.size
+
+    def clear(self):
+        self.data = None
+        self.index = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+
+# ===== Filters =====
+# Every filter takes a float or an array (e.g. a (16, 3) keypoint array, filtered per channel)
+# with `filter(value, timestamp=None)` and returns the smoothed value of the same shape.
+
+class MovingAverage:
+    """Mean of the last `window` values, updated in O(1) with a running sum."""
+
+    def __init__(self, window=10):
+        self.buffer = RingBuffer(window)
+        self.total = None
+
+    def __call__(self, value, timestamp=None):
+        value = np.asarray(value, dtype=np.float64)
+        overwritten = self.buffer.append(value)
+        self.total = value.copy() if self.total is None else self.total + value
+        if overwritten is not None:
+            self.total -= overwritten
+        if self.buffer.index == 0:
+            # Once per window: recompute the sum so rounding errors can't build up over long sessions
+            self.total = self.buffer.data.sum(axis=0)
+        return _like(value, self.total / len(self.buffer))
+
+    def reset(self):
+        self.buffer.clear()
+        self.total = None
+
+
+class ExponentialMovingAverage:
+    """Exponential moving average: smoothed = alpha * value + (1 - alpha) * smoothed."""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.smoothed = None
+
+    def __call__(self, value, timestamp=None):
+        value = np.asarray(value, dtype=np.float64)
+        if self.smoothed is None:
+            self.smoothed = value.copy()
+        else:
+            self.smoothed = self.alpha * value + (1 - self.alpha) * self.smoothed
+        return _like(value, self.smoothed)
+
+    def reset(self):
+        self.smoothed = None
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al. 2012): an EMA whose cutoff frequency rises
+    with the speed of the signal, so it smooths jitter when the subject is still
+    and follows quickly when it moves.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.0, d_cutoff=1.0, fps=30):
+        """
+        Args:
+            min_cutoff (float): Cutoff frequency (Hz) at zero speed; lower = smoother.
+            beta (float): How fast the cutoff rises with speed; higher = less lag.
+            d_cutoff (float): Cutoff frequency (Hz) for the speed estimate.
+            fps (float): Frame rate assumed when no timestamps are given.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.default_dt = 1.0 / fps
+        self.reset()
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, timestamp=None):
+        value = np.asarray(value, dtype=np.float64)
+        if self.smoothed is None:
+            self.smoothed = value.copy()
+            self.derivative = np.zeros_like(value)
+            self.last_timestamp = timestamp
+            return _like(value, self.smoothed)
+
+        dt = self.default_dt
+        if timestamp is not None and self.last_timestamp is not None and timestamp > self.last_timestamp:
+            dt = timestamp - self.last_timestamp
+        self.last_timestamp = timestamp
+
+        derivative = (value - self.smoothed) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.derivative = a_d * derivative + (1 - a_d) * self.derivative
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivative)
+        a = self._alpha(cutoff, dt)
+        self.smoothed = a * value + (1 - a) * self.smoothed
+        return _like(value, self.smoothed)
+
+    def reset(self):
+        self.smoothed = None
+        self.derivative = None
+        self.last_timestamp = None
+
+
+class PassThrough:
+    """Returns the values unchanged (smoothing turned off)."""
+
+    def __call__(self, value, timestamp=None):
+        return value
+
+    def reset(self):
+        pass
+
+
+def _like(value, result):
+    """Returns a float for scalar input and an array otherwise."""
+    return float(result) if value.ndim == 0 else result.copy()
+
+
+def create_filter(kind='moving_average', **options):
+    """
+    Creates a streaming filter by name.
+
+    Args:
+        kind (str): 'moving_average', 'ema' or 'one_euro' (or 'none' to pass values through).
+        **options: Passed to the filter (e.g. window=10, alpha=0.3, min_cutoff=1.0, beta=0.0).
+    Returns:
+        A callable `filter(value, timestamp=None)`.
+    Raises:
+        ValueError: For an unknown filter, or an option the filter doesn't take.
+    """
+    filters = {
+        'moving_average': MovingAverage,
+        'ema': ExponentialMovingAverage,
+        'one_euro': OneEuroFilter,
+        'none': PassThrough,
+    }
+    if kind not in filters:
+        raise ValueError(f"Unknown filter '{kind}'. Choose from: {', '.join(filters)}")
+    accepted = inspect.signature(filters[kind]).parameters
+    unknown = [name for name in options if name not in accepted]
+    if unknown:
+        raise ValueError(f"The '{kind}' filter has no option {', '.join(unknown)}. "
+                         f"Its options: {', '.join(accepted) or 'none'}")
+    return filters[kind](**options)
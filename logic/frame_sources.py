@@ -0,0 +1,548 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from logic.mjpeg import MjpegStreamReader, FrameRateMeter
+
+
+class FrameSource:
+    """
+    Common interface for everything the processing engine can read frames from.
+
+    Usage:
+        source.open()
+        while (item := source.read()) is not None:
+            frame, timestamp = item
+        source.release()
+
+    `read()` returns a `(frame, timestamp)` tuple, or None once the stream is
+    finished. `stop()` may be called from another thread to interrupt a read
+    that is waiting for a frame.
+    """
+    is_live = False     # True for cameras/streams, False for offline files
+    default_fps = 30
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+
+    def open(self):
+        """Opens the source. Raises RuntimeError if it cannot be opened."""
+
+    def read(self):
+        """Returns the next `(frame, timestamp)` tuple, or None at the end of the stream."""
+        raise NotImplementedError
+
+    def fps(self):
+        """The frame rate used for the output video writers."""
+        return self.default_fps
+
+    def stop(self):
+        """Interrupts a blocking `read()` from another thread."""
+        self.stop_event.set()
+
+    def release(self):
+        """Frees the underlying device, file or connection."""
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# ===== Latest-frame grabber =====
+class LatestFrameGrabber:
+    """
+    Calls a blocking `grab()` function on a background thread and keeps only
+    the newest frame. A consumer that is slower than the camera always gets
+    the freshest image; frames it never picked up are dropped, not queued.
+    """
+    END = object()  # Returned by `grab()` to end the stream
+
+    def __init__(self, grab, name="frame-grabber"):
+        """
+        Args:
+            grab (callable): Returns the next frame, None for a missed frame (it is retried),
+                or raises to end the stream. Returning `LatestFrameGrabber.END` also ends it.
+            name (str): Name of the background thread.
+        """
+        self.grab = grab
+        self.condition = threading.Condition()
+        self.latest = None          # The newest (frame, timestamp) not yet read
+        self.finished = False
+        self.error = None
+        self.frames_grabbed = 0
+        self.dropped_frames = 0     # Frames replaced before anyone read them
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _loop(self):
+        try:
+            while not self.stop_event.is_set():
+                frame = self.grab()
+                if frame is self.END:
+                    break
+                if frame is None:
+                    continue
+                with self.condition:
+                    if self.latest is not None:
+                        self.dropped_frames += 1
+                    self.latest = (frame, time.time())
+                    self.frames_grabbed += 1
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def read(self, timeout=None):
+        """
+        Waits for a frame newer than the last one returned.
+        Returns `(frame, timestamp)`, or None once the grabber stopped or `timeout` expired.
+        Re-raises an exception raised by `grab()`.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.finished, timeout)
+            if self.latest is None:
+                if self.error is not None:
+                    raise self.error
+                return None
+            item, self.latest = self.latest, None
+            return item
+
+    def stop(self, join_timeout=2):
+        self.stop_event.set()
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=join_timeout)
+
+
+# ===== Video file =====
+class DecodeOptions:
+    """
+    How VideoFileSource decodes a file: which OpenCV backend, how many decode
+    threads, hardware acceleration, an optional reduced output size and a
+    frame step for skimming long recordings.
+    """
+    backends = {
+        'any': cv2.CAP_ANY,
+        'ffmpeg': cv2.CAP_FFMPEG,
+        'gstreamer': cv2.CAP_GSTREAMER,
+        'msmf': cv2.CAP_MSMF,
+        'avfoundation': cv2.CAP_AVFOUNDATION,
+    }
+
+    def __init__(self, backend='any', threads=0, hw_acceleration=False, max_size=None, frame_step=1):
+        """
+        Args:
+            backend (str): One of `DecodeOptions.backends`.
+            threads (int): Decoder threads (0 lets the backend decide).
+            hw_acceleration (bool): Ask the backend for any available hardware decoder.
+            max_size (int): Downscale frames so their longer side is at most this many pixels (None keeps the original size).
+            frame_step (int): Return every Nth frame; the frames in between are grabbed but never converted.
+        """
+        if backend not in self.backends:
+            raise ValueError(f"Invalid decode backend '{backend}'. Valid options: {list(self.backends.keys())}")
+        self.backend = backend
+        self.threads = threads
+        self.hw_acceleration = hw_acceleration
+        self.max_size = max_size
+        self.frame_step = max(1, int(frame_step))
+
+    def open_params(self):
+        """The `cv2.VideoCapture` open parameters for these options."""
+        params = []
+        if self.threads:
+            params += [cv2.CAP_PROP_N_THREADS, int(self.threads)]
+        if self.hw_acceleration:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        return params
+
+    def __repr__(self):
+        return f"DecodeOptions(backend={self.backend!r}, threads={self.threads}, hw_acceleration={self.hw_acceleration}, max_size={self.max_size}, frame_step={self.frame_step})"
+
+
+class VideoFileSource(FrameSource):
+    """Reads frames from a video file, applying its rotation metadata and the DecodeOptions."""
+
+    def __init__(self, video_path, decode_options=None):
+        super().__init__()
+        self.video_path = video_path
+        self.decode_options = decode_options or DecodeOptions()
+        self.cap = None
+        self.rotation_code = None
+        self.output_size = None # (width, height) when frames are downscaled
+        self.interpolation = cv2.INTER_AREA
+
+    def open(self):
+        options = self.decode_options
+        self.cap = cv2.VideoCapture(self.video_path, options.backends[options.backend], options.open_params())
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open video file: {self.video_path}")
+        self.rotation_code = get_video_rotation(self.cap)
+
+        if options.max_size:
+            width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+            height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+            scale = options.max_size / max(width, height, 1)
+            if scale < 1:
+                self.output_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                # INTER_AREA is cheap for whole-number factors but very slow otherwise
+                factor = width / self.output_size[0]
+                self.interpolation = cv2.INTER_AREA if factor.is_integer() else cv2.INTER_LINEAR
+
+    def read(self):
+        # Skipped frames are only grabbed, never retrieved/converted to BGR
+        for _ in range(self.decode_options.frame_step - 1):
+            if not self.cap.grab():
+                return None
+        ret, frame = self.cap.read()
+        if not ret:
+            return None # End of video
+        if self.output_size is not None:
+            # Downscale before rotating so the rotation touches fewer pixels
+            frame = cv2.resize(frame, self.output_size, interpolation=self.interpolation)
+        if self.rotation_code is not None:
+            frame = cv2.rotate(frame, self.rotation_code)
+        timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return frame, timestamp
+
+    def fps(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap else 0
+        if not fps or fps <= 0:
+            return self.default_fps
+        return max(1, int(fps / self.decode_options.frame_step))
+
+    def backend_name(self):
+        """Name of the backend OpenCV actually picked."""
+        return self.cap.getBackendName() if self.cap else None
+
+    def release(self):
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+
+# ===== Live sources =====
+class LiveFrameSource(FrameSource):
+    """
+    Base class for cameras and streams. A LatestFrameGrabber thread calls
+    `_grab()` continuously and `read()` always returns the newest frame, so
+    end-to-end latency stays bounded however slow the selected model is.
+    Frames the processing never picked up are counted in `dropped_frames()`.
+
+    Subclasses connect in `_connect()` and return one frame per `_grab()` call
+    (None for a missed frame, `LatestFrameGrabber.END` when the stream closed).
+    """
+    is_live = True
+    thread_name = "live-capture"
+
+    def __init__(self, measure_seconds=1.0, measure_frames=10):
+        """
+        Args:
+            measure_seconds (float): Longest time `open()` waits to measure the frame rate.
+            measure_frames (int): Stop measuring once this many frames arrived.
+        """
+        super().__init__()
+        self.measure_seconds = measure_seconds
+        self.measure_frames = measure_frames
+        self.grabber = None
+        self.meter = FrameRateMeter()
+
+    def _connect(self):
+        """Opens the device or connection. Raises RuntimeError on failure."""
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def _disconnect(self):
+        """Closes the device or connection; also used to unblock a waiting `_grab()`."""
+
+    def _grab_and_count(self):
+        frame = self._grab()
+        if frame is not None and frame is not LatestFrameGrabber.END:
+            self.meter.tick()
+        return frame
+
+    def open(self):
+        self._connect()
+        self.grabber = LatestFrameGrabber(self._grab_and_count, name=self.thread_name)
+        self.grabber.start()
+
+        # Measure the real frame rate before the video writers are created
+        deadline = time.monotonic() + self.measure_seconds
+        while self.meter.count < self.measure_frames and time.monotonic() < deadline and not self.grabber.finished:
+            time.sleep(0.01)
+        if self.grabber.error is not None:
+            raise RuntimeError(str(self.grabber.error))
+        self.grabber.dropped_frames = 0 # Frames skipped while measuring don't count
+        print(f"{self.__class__.__name__} measured at {self.fps()} FPS")
+
+    def read(self):
+        while not self.stop_event.is_set():
+            item = self.grabber.read(timeout=0.1) # Re-raises an error from the capture thread
+            if item is not None:
+                return item
+            if self.grabber.finished:
+                return None
+        return None
+
+    def fps(self):
+        measured = self.meter.fps()
+        return max(1.0, round(measured, 1)) if measured else self.default_fps
+
+    def dropped_frames(self):
+        """Frames captured but replaced by a newer one before the processing read them."""
+        return self.grabber.dropped_frames if self.grabber else 0
+
+    def release(self):
+        self.stop_event.set()
+        if self.grabber:
+            self.grabber.stop_event.set()
+        self._disconnect()
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
+
+
+# ===== Webcam =====
+class WebcamSource(LiveFrameSource):
+    """
+    Reads frames from a local camera on a capture thread that keeps only the
+    newest frame, so frames never pile up in the driver buffer.
+    """
+    default_fps = 15 # Assume a reasonable FPS for webcam saving
+    thread_name = "webcam-capture"
+
+    def __init__(self, camera_index=0, **kwargs):
+        super().__init__(**kwargs)
+        self.camera_index = camera_index
+        self.cap = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        self.cap = cv2.VideoCapture(self.camera_index)
+        if not self.cap.isOpened():
+            raise RuntimeError("Could not open webcam.")
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Not every backend honours this; the grabber covers the rest
+
+    def _grab(self):
+        with self.lock:
+            if self.cap is None:
+                return LatestFrameGrabber.END
+            ret, frame = self.cap.read()
+        if not ret:
+            if self.stop_event.is_set():
+                return LatestFrameGrabber.END
+            raise RuntimeError("Failed to capture frame from webcam.")
+        return frame
+
+    def _disconnect(self):
+        # Wait for a read in progress so the capture is not released under it
+        with self.lock:
+            if self.cap:
+                self.cap.release()
+                self.cap = None
+
+
+# ===== IP camera snapshots =====
+def create_http_session(pool_size=2):
+    """A requests session with a small keep-alive connection pool for one camera."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class IPCameraSnapshotSource(LiveFrameSource):
+    """
+    Polls single JPEG snapshots from an IP camera, e.g. the IP Webcam
+    Android app's `http://<ip>:8080/shot.jpg` endpoint.
+
+    The requests go through one keep-alive session instead of opening a new
+    TCP connection per frame, and the capture thread fetches and decodes in
+    the background, so inference never waits on a network round-trip.
+    """
+    default_fps = 7
+    thread_name = "phone-prefetch"
+
+    def __init__(self, url, timeout=1.5, connect_timeout=5, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.session = None
+
+    @classmethod
+    def from_ip(cls, ip_address, port=8080, **kwargs):
+        return cls(f"http://{ip_address}:{port}/shot.jpg", **kwargs)
+
+    def _fetch(self, timeout):
+        img_resp = self.session.get(self.url, timeout=timeout)
+        img_resp.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+        img_arr = np.frombuffer(img_resp.content, dtype=np.uint8)
+        return cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+
+    def _connect(self):
+        print(f"Attempting to connect to phone camera at: {self.url}")
+        self.session = create_http_session()
+        # Fetch one frame up front so a wrong IP fails fast with a clear message
+        try:
+            first_frame = self._fetch(self.connect_timeout)
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Could not connect to phone camera. Check IP address and that the IP Webcam app is running. Error: {e}")
+        if first_frame is None:
+            raise RuntimeError("Failed to decode the first frame from the phone camera. Check the IP Webcam app is running and the URL is correct.")
+
+    def _grab(self):
+        try:
+            frame = self._fetch(self.timeout)
+        except requests.exceptions.RequestException:
+            if self.stop_event.is_set():
+                return LatestFrameGrabber.END
+            # Don't stop the whole process, just log that a frame was missed.
+            print("Warning: Failed to get a frame from phone camera. Will retry.")
+            self.stop_event.wait(0.1)
+            return None
+        if frame is None:
+            print("Warning: Skipped a bad frame from phone camera.")
+        return frame
+
+    def _disconnect(self):
+        if self.session:
+            self.session.close()
+            self.session = None
+
+
+# ===== MJPEG stream =====
+class MjpegStreamSource(LiveFrameSource):
+    """
+    Reads a `multipart/x-mixed-replace` MJPEG stream, e.g. IP Webcam's `/video`
+    endpoint. The camera pushes frames over one long-lived connection, which
+    MjpegStreamReader splits into JPEGs inside a reusable buffer; the capture
+    thread decodes them and `read()` returns the newest one.
+    """
+    default_fps = 15
+    thread_name = "mjpeg-reader"
+
+    def __init__(self, url, connect_timeout=5, read_timeout=5, **kwargs):
+        """
+        Args:
+            url (str): The MJPEG stream URL.
+            connect_timeout (float): Seconds to wait for the connection.
+            read_timeout (float): Seconds without data before the stream is considered lost.
+        """
+        super().__init__(**kwargs)
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = None
+        self.response = None
+        self.reader = None
+
+    @classmethod
+    def from_ip(cls, ip_address, port=8080, **kwargs):
+        return cls(f"http://{ip_address}:{port}/video", **kwargs)
+
+    def _connect(self):
+        print(f"Attempting to connect to MJPEG stream at: {self.url}")
+        self.session = create_http_session(pool_size=1)
+        try:
+            self.response = self.session.get(self.url, stream=True, timeout=(self.connect_timeout, self.read_timeout))
+            self.response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Could not connect to the MJPEG stream. Check IP address and that the IP Webcam app is running. Error: {e}")
+
+        content_type = self.response.headers.get('Content-Type', '')
+        boundary = MjpegStreamReader.boundary_from_content_type(content_type)
+        if boundary is None:
+            raise RuntimeError(f"Not an MJPEG stream (Content-Type: '{content_type}'): {self.url}")
+        self.reader = MjpegStreamReader(self.response.raw, boundary)
+
+    def _grab(self):
+        try:
+            jpeg = self.reader.next_frame()
+        except Exception:
+            if self.stop_event.is_set():
+                return LatestFrameGrabber.END # The connection was closed by release()
+            raise
+        if jpeg is None:
+            return LatestFrameGrabber.END # Stream closed by the camera
+        img_arr = np.frombuffer(jpeg, dtype=np.uint8) # A view into the reader's buffer, no copy
+        frame = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
+        del img_arr
+        jpeg.release() # The reader may now reuse/grow its buffer
+        if frame is None:
+            print("Warning: Skipped a bad frame from the MJPEG stream.")
+        return frame
+
+    def _disconnect(self):
+        if self.response:
+            self.response.close() # Unblocks a reader waiting on the socket
+            self.response = None
+        if self.session:
+            self.session.close()
+            self.session = None
+
+
+# ===== Image directory =====
+class ImageDirectorySource(FrameSource):
+    """Reads an ordered sequence of images from a directory as if it were a video."""
+    image_extensions = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, directory, fps=30):
+        super().__init__()
+        self.directory = directory
+        self.default_fps = fps
+        self.paths = []
+        self.index = 0
+
+    def open(self):
+        if not os.path.isdir(self.directory):
+            raise RuntimeError(f"Could not open image directory: {self.directory}")
+        self.paths = sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.lower().endswith(self.image_extensions)
+        )
+        if not self.paths:
+            raise RuntimeError(f"No images found in directory: {self.directory}")
+        self.index = 0
+
+    def read(self):
+        while self.index < len(self.paths):
+            path = self.paths[self.index]
+            timestamp = self.index / self.default_fps
+            self.index += 1
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Warning: Skipped unreadable image {path}")
+                continue
+            return frame, timestamp
+        return None
+
+
+# ===== Get video rotation =====
+def get_video_rotation(cap):
+    """Returns the cv2.rotate code that undoes the video's orientation metadata, or None."""
+    orientation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META))
+    if orientation == 90:
+        return cv2.ROTATE_90_CLOCKWISE
+    elif orientation == -90:
+        return cv2.ROTATE_90_COUNTERCLOCKWISE
+    elif orientation == 180:
+        return cv2.ROTATE_180
+    return None
@@ -0,0 +1,455 @@
+import json
+import os
+import time
+import numpy as np
+from logic.skeleton import JOINT_NAMES, JOINT_INDEX, AXES, Skeleton
+
+KEYPOINTS_DIR = os.path.join('outputs', 'keypoints')
+
+# File extension of each format
+FORMATS = {
+    'json': '.json',    # One JSON array of frames (the classic format, same layout as `save_keypoints`)
+    'jsonl': '.jsonl',  # JSON Lines: one frame per line
+    'npy': '.npy',      # Binary (frames, 16, 3) float32 + timestamps .npy + .meta.json sidecar, memory-mappable
+}
+
+BINARY_VERSION = 1
+NPY_HEADER_SIZE = 128  # Fixed, so the frame count can be rewritten in place when the file is closed
+
+
+def keypoints_path(file_name, fmt):
+    """The path in outputs/keypoints for `file_name`, with the format's extension added if missing."""
+    extension = FORMATS[fmt]
+    if not file_name.endswith(extension):
+        file_name += extension
+    return os.path.join(KEYPOINTS_DIR, file_name)
+
+
+def create_keypoint_writer(file_name, fmt='json'):
+    """Creates the streaming writer for a keypoints format ('json', 'jsonl' or 'npy')."""
+    if fmt == 'npy':
+        return BinaryKeypointWriter(file_name)
+    return KeypointWriter(file_name, fmt)
+
+
+class KeypointWriter:
+    """
+    Streams the keypoints of a session to disk frame by frame, so memory use does
+    not grow with the session length and a crash only loses the last unflushed frames.
+
+    The data is flushed to the OS every `flush_every` frames or `flush_seconds`
+    seconds. A JSON array stays open (no closing bracket) until `close()`; files
+    left behind by a crash can be read with `load_keypoints` or fixed with
+    `repair_keypoints`.
+    """
+
+    binary = False
+
+    def __init__(self, file_name, fmt='json', flush_every=30, flush_seconds=1.0, indent=4):
+        """
+        Args:
+            file_name (str): Name of the file in outputs/keypoints (the extension is added if missing).
+            fmt (str): 'json' (array) or 'jsonl' (one frame per line).
+            flush_every (int): Flush after this many frames.
+            flush_seconds (float): Flush when this much time passed since the last flush.
+            indent (int): Indentation of the JSON array format (None for compact frames).
+        """
+        if fmt not in ('json', 'jsonl'):
+            raise ValueError(f"Unknown keypoints format '{fmt}'. Choose from: json, jsonl")
+        self.fmt = fmt
+        self.path = keypoints_path(file_name, fmt)
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.indent = indent
+
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.frames_written = 0
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+        if fmt == 'json':
+            self.file.write('[')
+
+    def write(self, keypoints, timestamp=None):
+        """Appends one frame's keypoints dict (the JSON formats don't store the timestamp)."""
+        if self.fmt == 'jsonl':
+            self.file.write(json.dumps(keypoints, separators=(',', ':')))
+            self.file.write('\n')
+        else:
+            separator = ',\n' if self.frames_written else '\n'
+            if self.indent is None:
+                text = json.dumps(keypoints)
+            else:
+                # Indented one level deeper, like json.dump(all_frames, f, indent=4) would write it
+                pad = ' ' * self.indent
+                text = pad + json.dumps(keypoints, indent=self.indent).replace('\n', '\n' + pad)
+            self.file.write(separator + text)
+
+        self.frames_written += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Finishes the file (closes the JSON array) and syncs it to disk."""
+        if self.file.closed:
+            return
+        if self.fmt == 'json':
+            self.file.write('\n]' if self.frames_written else ']')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BinaryKeypointWriter:
+    """
+    Streams keypoints as raw float32 frames into a `.npy` file ((frames, 16, 3),
+    rows in JOINT_NAMES order), the timestamps into `<name>.timestamps.npy`
+    (float64 seconds) and writes a `<name>.meta.json` sidecar with the joint names.
+
+    The .npy header has a fixed size and is rewritten with the real frame count
+    on `close()`; after a crash `load_keypoint_arrays` works the count out from
+    the file size, so only the last unflushed frames are lost.
+    """
+
+    binary = True
+
+    def __init__(self, file_name, flush_every=30, flush_seconds=1.0):
+        if file_name.endswith('.npy'):
+            file_name = file_name[:-len('.npy')]
+        self.path = keypoints_path(file_name, 'npy')
+        self.timestamps_path = timestamps_path(self.path)
+        self.meta_path = meta_path(self.path)
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+
+        self.has_z = None
+        self.frames_written = 0
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+        self.file = open(self.path, 'wb')
+        self.file.write(npy_header('<f4', (0, len(JOINT_NAMES), 3)))
+        self.timestamps_file = open(self.timestamps_path, 'wb')
+        self.timestamps_file.write(npy_header('<f8', (0,)))
+
+    def write(self, keypoints, timestamp=None):
+        """Appends one frame (a Skeleton or a keypoints dict) and its timestamp in seconds."""
+        if not isinstance(keypoints, Skeleton):
+            keypoints = Skeleton.from_dict(keypoints)
+        if self.has_z is None:
+            self.has_z = keypoints.has_z
+            write_meta(self.meta_path, self.has_z, None)  # Written up front, so a crashed session keeps its names
+
+        self.file.write(np.ascontiguousarray(keypoints.coords, dtype='<f4').tobytes())
+        self.timestamps_file.write(np.float64(np.nan if timestamp is None else timestamp).tobytes())
+
+        self.frames_written += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.timestamps_file.flush()
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Writes the final frame count into the headers and the sidecar."""
+        if self.file.closed:
+            return
+        for f, descr, shape in ((self.file, '<f4', (self.frames_written, len(JOINT_NAMES), 3)),
+                                (self.timestamps_file, '<f8', (self.frames_written,))):
+            f.seek(0)
+            f.write(npy_header(descr, shape))
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        write_meta(self.meta_path, self.has_z if self.has_z is not None else True, self.frames_written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ===== Binary format helpers =====
+def timestamps_path(npy_path):
+    return npy_path[:-len('.npy')] + '.timestamps.npy'
+
+
+def meta_path(npy_path):
+    return npy_path[:-len('.npy')] + '.meta.json'
+
+
+def npy_header(descr, shape):
+    """An NPY v1.0 header of exactly NPY_HEADER_SIZE bytes."""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {tuple(shape)}, }}"
+    padding = NPY_HEADER_SIZE - 10 - len(header) - 1
+    if padding < 0:
+        raise ValueError("Shape too large for the fixed NPY header.")
+    header = header + ' ' * padding + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin-1')
+
+
+def write_meta(path, has_z, frames):
+    meta = {
+        'version': BINARY_VERSION,
+        'joint_names': list(JOINT_NAMES),
+        'has_z': has_z,
+        'frames': frames,  # None while the session is still being written
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=4)
+
+
+def _open_npy(path, frame_shape, mmap):
+    """Opens a streamed .npy; if it was never closed, the frame count comes from the file size."""
+    with open(path, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        header = np.lib.format.read_array_header_1_0(f) if version == (1, 0) else np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    shape, _, dtype = header
+    frame_bytes = int(np.prod(frame_shape, dtype=np.int64)) * dtype.itemsize
+    frames = (os.path.getsize(path) - offset) // frame_bytes
+    if frames == 0:
+        return np.zeros((0,) + tuple(frame_shape), dtype=dtype)
+    array = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(frames,) + tuple(frame_shape))
+    return array if mmap else np.array(array)
+
+
+def load_keypoint_arrays(path, mmap=False):
+    """
+    Loads keypoints as arrays from any supported file.
+
+    Args:
+        path (str): A .npy (with its .timestamps.npy/.meta.json next to it), .npz, .json or .jsonl file.
+        mmap (bool): Memory-map .npy files instead of reading them (instant, sliceable without loading).
+    Returns:
+        (joints, timestamps, meta): (frames, 16, 3) float32 array, (frames,) float64 seconds
+        (NaN where unknown) and a dict with 'joint_names' and 'has_z'.
+    """
+    if path.endswith('.npy'):
+        joints = _open_npy(path, (len(JOINT_NAMES), 3), mmap)
+        timestamps = np.full(len(joints), np.nan)
+        if os.path.exists(timestamps_path(path)):
+            stored = _open_npy(timestamps_path(path), (), mmap)
+            if len(stored) >= len(joints):
+                timestamps = stored[:len(joints)]
+            else:
+                timestamps[:len(stored)] = stored
+        meta = {'joint_names': list(JOINT_NAMES), 'has_z': True}
+        if os.path.exists(meta_path(path)):
+            with open(meta_path(path), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        return joints, timestamps, meta
+
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return data['joints'], data['timestamps'], meta
+
+    frames = load_keypoints(path)
+    joints, has_z = keypoints_to_array(frames)
+    return joints, np.full(len(joints), np.nan), {'joint_names': list(JOINT_NAMES), 'has_z': has_z}
+
+
+def keypoints_to_array(frames):
+    """Converts a list of keypoint dicts to a (frames, 16, 3) float32 array. Returns (array, has_z)."""
+    has_z = bool(frames) and all('z' in frames[0][name] for name in JOINT_NAMES)
+    joints = np.array(
+        [[(frame[name]['x'], frame[name]['y'], frame[name]['z'] if has_z else 0.0) for name in JOINT_NAMES] for frame in frames],
+        dtype=np.float32,
+    ).reshape(-1, len(JOINT_NAMES), 3)
+    return joints, has_z
+
+
+def save_keypoint_arrays(path, joints, timestamps=None, has_z=True):
+    """
+    Saves keypoint arrays as `.npz` (one compressed file) or as `.npy` + sidecars.
+
+    Args:
+        path (str): Output path ending in .npz or .npy.
+        joints (numpy.ndarray): (frames, 16, 3) array in JOINT_NAMES order.
+        timestamps (numpy.ndarray): (frames,) seconds, or None.
+        has_z (bool): Whether the z column holds data.
+    """
+    joints = np.asarray(joints, dtype=np.float32)
+    timestamps = np.full(len(joints), np.nan) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+    if path.endswith('.npz'):
+        meta = {'version': BINARY_VERSION, 'joint_names': list(JOINT_NAMES), 'has_z': has_z, 'frames': len(joints)}
+        np.savez_compressed(path, joints=joints, timestamps=timestamps, meta=np.array(json.dumps(meta)))
+    elif path.endswith('.npy'):
+        np.save(path, joints)
+        np.save(timestamps_path(path), timestamps)
+        write_meta(meta_path(path), has_z, len(joints))
+    else:
+        raise ValueError("Binary keypoints must be saved as .npz or .npy")
+
+
+class KeypointRecording:
+    """
+    Random access to a recorded session without loading it.
+
+    Binary `.npy` recordings are memory-mapped: opening is instant and only the
+    frames that are actually read come from disk, so scrubbing through hours of
+    capture stays fast. (`.npz` and JSON files work too, but are loaded fully.)
+
+    Example:
+        recording = KeypointRecording('outputs/keypoints/session.npy')
+        clip = recording[1000:1300]                 # (300, 16, 3) view
+        hip_z = recording.joint('hip', 'z')         # (frames,) column view
+        index = recording.frame_at(62.5)            # Frame shown at 62.5 s
+        keypoints = recording.keypoints(index)      # The usual keypoints dict
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.joints, self.timestamps, self.meta = load_keypoint_arrays(path, mmap=True)
+        self.has_z = self.meta.get('has_z', True)
+
+    def __len__(self):
+        return len(self.joints)
+
+    def __getitem__(self, index):
+        """Frames by index or slice: (16, 3) or (n, 16, 3) arrays (views for memory-mapped files)."""
+        return self.joints[index]
+
+    # ===== Frames =====
+    def frames(self, start, stop=None):
+        """The (n, 16, 3) frames in [start, stop)."""
+        return self.joints[start:stop]
+
+    def skeleton(self, index):
+        """One frame as a Skeleton (a copy, so it can be modified)."""
+        return Skeleton(np.array(self.joints[index]), self.has_z)
+
+    def keypoints(self, index):
+        """One frame as the saved/sent keypoints dict."""
+        return Skeleton(self.joints[index], self.has_z).to_dict()
+
+    # ===== Joints =====
+    def joint(self, name, axis=None):
+        """
+        The track of one joint over the whole recording, as a view:
+        (frames, 3), or (frames,) for a single axis ('x', 'y' or 'z').
+        """
+        if axis is None:
+            return self.joints[:, JOINT_INDEX[name], :]
+        return self.joints[:, JOINT_INDEX[name], AXES[axis]]
+
+    # ===== Time =====
+    def has_timestamps(self):
+        return len(self.timestamps) > 0 and not np.isnan(self.timestamps[0])
+
+    def duration(self):
+        """Seconds between the first and the last frame (0 without timestamps)."""
+        if not self.has_timestamps():
+            return 0.0
+        return float(self.timestamps[-1] - self.timestamps[0])
+
+    def frame_at(self, timestamp):
+        """Index of the frame shown at `timestamp` seconds (the last frame at or before it)."""
+        if not self.has_timestamps():
+            raise ValueError(f"{self.path} has no timestamps.")
+        index = int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1
+        return min(max(index, 0), len(self) - 1)
+
+    def time_range(self, start, end):
+        """The (n, 16, 3) frames with start <= timestamp < end, and their timestamps."""
+        if not self.has_timestamps():
+            raise ValueError(f"{self.path} has no timestamps.")
+        first = int(np.searchsorted(self.timestamps, start, side='left'))
+        last = int(np.searchsorted(self.timestamps, end, side='left'))
+        return self.joints[first:last], self.timestamps[first:last]
+
+    def close(self):
+        """Drops the recording's memory maps (they are unmapped once no views of them are left)."""
+        self.joints = self.timestamps = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ===== Reading and crash recovery =====
+def load_keypoints(path):
+    """
+    Reads a JSON keypoints file (array or JSON Lines) into a list of frames.
+    Files that were cut off by a crash are read up to the last complete frame.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(FORMATS['jsonl']):
+        return _parse_json_lines(text)
+    return _parse_json_array(text)
+
+
+def repair_keypoints(path):
+    """
+    Rewrites a keypoints file left unfinished by a crash so it is valid again
+    (keeping every complete frame). Returns the number of frames kept.
+    """
+    frames = load_keypoints(path)
+    fmt = 'jsonl' if path.endswith(FORMATS['jsonl']) else 'json'
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        if fmt == 'jsonl':
+            for frame in frames:
+                f.write(json.dumps(frame, separators=(',', ':')) + '\n')
+        else:
+            json.dump(frames, f, indent=4)
+    os.replace(temp_path, path)
+    return len(frames)
+
+
+def _parse_json_lines(text):
+    frames = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            frames.append(json.loads(line))
+        except json.JSONDecodeError:
+            break  # A half-written last line
+    return frames
+
+
+def _parse_json_array(text):
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, list) else [data]
+    except json.JSONDecodeError:
+        pass
+
+    # Unfinished array: decode the frames one by one until the data runs out
+    decoder = json.JSONDecoder()
+    frames = []
+    position = text.find('[') + 1
+    if position == 0:
+        return frames
+    while True:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            return frames
+        try:
+            frame, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            return frames
+        frames.append(frame)
@@ -1,41 +1,99 @@
 import cv2
+import threading
+from collections import OrderedDict
 import numpy as np
 import mediapipe as mp
 from logic.system_functions import (
 
-    extract_2D_landmarks,
-    calculate_extra_landmarks,
-    get_required_landmark,
-    denormalize_landmarks,
-    project_landmarks,
-    project_skeleton,
     save_keypoints,
     save_processed_image,
     project_special_values
 )
 from logic.system_functions import load_image_with_orientation
+from logic.frame_sources import get_video_rotation
+from logic.skeleton import Skeleton, draw_landmarks, draw_skeleton
+
+
+def create_pose(model_complexity, static_image_mode):
+    """Builds a MediaPipe Pose graph for static images or for video streams."""
+    if static_image_mode:
+        # Pose instance for static images
+        return mp.solutions.pose.Pose(
+            static_image_mode=True,
+            model_complexity=model_complexity,
+            min_detection_confidence=0.5
+        )
+    # Pose instance for video streams
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=model_complexity,
+        smooth_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+
+class PosePool:
+    """
+    MediaPipe Pose graphs keyed by (model complexity, static image mode).
+
+    Graphs are built on first use and reused afterwards, so switching between
+    the light and heavy model doesn't rebuild them. When more than `max_graphs`
+    are open, the least recently used one is closed.
+    """
+
+    def __init__(self, max_graphs=3):
+        self.max_graphs = max_graphs
+        self.graphs = OrderedDict()  # (complexity, static_image_mode) -> Pose, least recently used first
+        self.lock = threading.Lock()
+
+    def get(self, model_complexity, static_image_mode):
+        key = (model_complexity, static_image_mode)
+        with self.lock:
+            pose = self.graphs.get(key)
+            if pose is not None:
+                self.graphs.move_to_end(key)
+                return pose
+            pose = create_pose(model_complexity, static_image_mode)
+            self.graphs[key] = pose
+            while len(self.graphs) > self.max_graphs:
+                (complexity, static), evicted = self.graphs.popitem(last=False)
+                evicted.close()
+                print(f"Closed the MediaPipe Pose graph (complexity {complexity}, {'image' if static else 'video'} mode)")
+            return pose
+
+    def close(self):
+        with self.lock:
+            for pose in self.graphs.values():
+                pose.close()
+            self.graphs.clear()
+
+
 class MediaProcessor:
     """
     Handles the entire media processing pipeline for images and videos.
     """ 
-    def __init__(self, model_complexity=1):
+    def __init__(self, model_complexity=1, pose_pool=None):
         """
-        Initializes the MediaProcessor and both MediaPipe Pose models.
+        Initializes the MediaProcessor. The MediaPipe Pose models come from a
+        PosePool and are built when first used.
         """
-        # Create a Pose instance for static images
-        self.image_pose = mp.solutions.pose.Pose(
-            static_image_mode=True,
-            model_complexity=model_complexity,
-            min_detection_confidence=0.5
-        )
-        # Create a separate Pose instance for video streams
-        self.video_pose = mp.solutions.pose.Pose(
-            static_image_mode=False,
-            model_complexity=model_complexity,
-            smooth_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5     
-        )
+        self.model_complexity = model_complexity
+        self.pose_pool = pose_pool or PosePool()
+
+    def set_model_complexity(self, model_complexity):
+        """Switches the light/heavy model. A running stream uses it from the next frame on."""
+        self.model_complexity = model_complexity
+
+    @property
+    def image_pose(self):
+        """The Pose instance for static images."""
+        return self.pose_pool.get(self.model_complexity, True)
+
+    @property
+    def video_pose(self):
+        """The separate Pose instance for video streams."""
+        return self.pose_pool.get(self.model_complexity, False)
 
     # ===== Process image =====
     def process_image(self, image_path, plot_landmarks, plot_skeleton, save_landmarks, landmarks_filename, save_image, output_size_str, image_filename, save_image_black_background, image_black_background_filename):
@@ -74,29 +132,24 @@ class MediaProcessor:
                 return image # Return the original image if no landmarks are found
 
             # --- Function Call Pipeline ---
-            # 1. Extract 2D landmarks
-            landmarks_2d = extract_2D_landmarks(results)
-
-            # 2. Calculate extra landmarks (head, neck, etc.)
-            extra_landmarks_list = calculate_extra_landmarks(landmarks_2d)
-
-            # 3. Get the final 16 required landmarks
-            required_landmarks_dict = get_required_landmark(landmarks_2d, extra_landmarks_list)
+            # 1-3. Extract the 2D landmarks and build the 16 required keypoints (with head, neck, etc.)
+            skeleton = Skeleton.from_landmarks(results.pose_landmarks.landmark, has_z=False)
 
             # 4. De-normalize landmark coordinates
-            denormalize_landmarks(image, required_landmarks_dict)
+            height, width = image.shape[:2]
+            skeleton.denormalize(width, height)
 
             # 5. Project landmarks onto the image (conditionally)
             if plot_landmarks:
-                project_landmarks(image, required_landmarks_dict)
+                draw_landmarks(image, skeleton)
 
             # 6. Project the skeleton connections (conditionally)
             if plot_skeleton:
-                project_skeleton(image, required_landmarks_dict)
+                draw_skeleton(image, skeleton)
 
             # 7. Save the landmark data to a file (conditionally)
             if save_landmarks and landmarks_filename:
-                save_keypoints(required_landmarks_dict, landmarks_filename)
+                save_keypoints(skeleton.to_dict(), landmarks_filename)
 
             # 8. Save the processed image (conditionally)
             if save_image and output_size_str:
@@ -106,9 +159,9 @@ class MediaProcessor:
             if save_image_black_background and image_black_background_filename:
                 black_background_image = np.zeros_like(image)
                 if plot_landmarks:
-                    project_landmarks(black_background_image, required_landmarks_dict)
+                    draw_landmarks(black_background_image, skeleton)
                 if plot_skeleton:
-                    project_skeleton(black_background_image, required_landmarks_dict)
+                    draw_skeleton(black_background_image, skeleton)
                 # 10. Save the processed image with black background
                 save_processed_image(black_background_image, image_black_background_filename, output_size_str)
 
@@ -125,7 +178,7 @@ class MediaProcessor:
             return None
 
     # ===== Process video frame by frame =====
-    def process_video_frame(self, frame, plot_landmarks, plot_skeleton, plot_values, save_video_black_background):
+    def process_video_frame(self, frame, plot_landmarks, plot_skeleton, plot_values, save_video_black_background, inference_frame=None):
         """
         Processes a single video frame.
 
@@ -135,38 +188,40 @@ class MediaProcessor:
             plot_skeleton (bool): Whether to draw the skeleton.
             plot_values (bool): Whether to draw the values for (wrists, head, ankles).
             save_video_black_background (bool): Whether to save the video with black background.
+            inference_frame: Optional downscaled copy of the frame to run MediaPipe on; drawing stays on the full frame.
         Returns:
             A tuple containing:
             - The processed frame (NumPy array).
-            - A dictionary of the final 16 required landmarks, or None.
+            - The Skeleton of the final 16 required landmarks (in pixels), or None.
+            - The black background frame, or None.
         """
         # Process the frame and find pose landmarks using the video model
-        results = self.video_pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if inference_frame is None:
+            inference_frame = frame
+        results = self.video_pose.process(cv2.cvtColor(inference_frame, cv2.COLOR_BGR2RGB))
         
-        required_landmarks_dict = None
+        skeleton = None
         if results.pose_landmarks:
-            landmarks_2d_list = extract_2D_landmarks(results)
-            extra_landmarks_list = calculate_extra_landmarks(landmarks_2d_list)
-            required_landmarks_dict = get_required_landmark(landmarks_2d_list, extra_landmarks_list)
-            denormalize_landmarks(frame, required_landmarks_dict)
+            height, width = frame.shape[:2]
+            skeleton = Skeleton.from_landmarks(results.pose_landmarks.landmark, has_z=False).denormalize(width, height)
             
             if plot_landmarks:
-                project_landmarks(frame, required_landmarks_dict)
+                draw_landmarks(frame, skeleton)
             if plot_skeleton:
-                project_skeleton(frame, required_landmarks_dict)
+                draw_skeleton(frame, skeleton)
             if plot_values:
-                project_special_values(frame, required_landmarks_dict)
+                project_special_values(frame, skeleton)
             if save_video_black_background:
                 black_background_frame = np.zeros_like(frame)
                 if plot_landmarks:
-                    project_landmarks(black_background_frame, required_landmarks_dict)
+                    draw_landmarks(black_background_frame, skeleton)
                 if plot_skeleton:
-                    project_skeleton(black_background_frame, required_landmarks_dict)
+                    draw_skeleton(black_background_frame, skeleton)
                 if plot_values:
-                    project_special_values(black_background_frame, required_landmarks_dict)
-                return frame, required_landmarks_dict, black_background_frame
+                    project_special_values(black_background_frame, skeleton)
+                return frame, skeleton, black_background_frame
             
-        return frame, required_landmarks_dict, None
+        return frame, skeleton, None
 
     # ===== Save video landmarks =====
     def save_video_landmarks(self, all_frame_landmarks, landmarks_filename):
@@ -176,19 +231,9 @@ class MediaProcessor:
 
     # ===== Get video rotation =====
     def get_video_rotation(self, cap):
-        orientation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META))        
-        if orientation == 90:
-            rotation_code= cv2.ROTATE_90_CLOCKWISE
-        elif orientation == -90:
-            rotation_code= cv2.ROTATE_90_COUNTERCLOCKWISE
-        elif orientation == 180:
-            rotation_code= cv2.ROTATE_180
-        else:
-            rotation_code= None
-        return rotation_code
+        return get_video_rotation(cap)
     
     # ===== Close =====
     def close(self):
-        """Clean up the MediaPipe Pose object."""
-        self.image_pose.close()
-        self.video_pose.close() 
\ No newline at end of file
+        """Clean up the MediaPipe Pose objects."""
+        self.pose_pool.close()
\ No newline at end of file
@@ -0,0 +1,163 @@
+import time
+from collections import deque
+
+
+class MjpegStreamReader:
+    """
+    Incremental parser for `multipart/x-mixed-replace` MJPEG streams.
+
+    Bytes are read from one long-lived connection into a single reusable
+    bytearray. `next_frame()` returns a memoryview of the JPEG bytes inside
+    that buffer, so it can go straight to `np.frombuffer` + `cv2.imdecode`
+    without copying. The view is only valid until the next call, so decode it
+    (and drop every reference to it) before asking for the next frame.
+    """
+
+    def __init__(self, stream, boundary, chunk_size=64 * 1024, max_frame_size=16 * 1024 * 1024):
+        """
+        Args:
+            stream: A binary file-like object (e.g. `requests` `response.raw`). `readinto1`/`read1`
+                are preferred because they return as soon as some data arrived.
+            boundary (str): The multipart boundary from the Content-Type header.
+            chunk_size (int): How many bytes to request per read.
+            max_frame_size (int): Give up if a single part grows beyond this many bytes.
+        """
+        self.stream = stream
+        boundary = boundary.strip().strip('"')
+        if not boundary.startswith('--'):
+            boundary = '--' + boundary
+        self.delimiter = boundary.encode('latin-1')
+        self.chunk_size = chunk_size
+        self.max_frame_size = max_frame_size
+
+        self.buffer = bytearray(chunk_size * 4)
+        self.start = 0  # First byte not consumed yet
+        self.end = 0    # One past the last valid byte
+
+    @staticmethod
+    def boundary_from_content_type(content_type):
+        """Extracts the boundary parameter from a multipart Content-Type header, or None."""
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'boundary' and value:
+                return value
+        return None
+
+    # ===== Buffer management =====
+    def _compact(self):
+        """Moves the unconsumed bytes to the front of the buffer."""
+        if self.start == 0:
+            return
+        remaining = self.end - self.start
+        if remaining:
+            self.buffer[:remaining] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = remaining
+
+    def _read_more(self):
+        """Reads one chunk into the free space of the buffer. Returns False at end of stream."""
+        if self.end + self.chunk_size > len(self.buffer):
+            if self.end - self.start > self.max_frame_size:
+                raise RuntimeError("MJPEG stream part is larger than the maximum frame size.")
+            self.buffer.extend(bytes(max(self.chunk_size, len(self.buffer))))
+        view = memoryview(self.buffer)[self.end:self.end + self.chunk_size]
+        try:
+            count = self._readinto(view)
+        finally:
+            view.release()
+        if not count:
+            return False
+        self.end += count
+        return True
+
+    def _readinto(self, view):
+        """Reads whatever is available (up to len(view) bytes) into `view`; never waits for a full chunk."""
+        if hasattr(self.stream, 'readinto1'):
+            return self.stream.readinto1(view)
+        if hasattr(self.stream, 'read1'):
+            data = self.stream.read1(len(view))
+            view[:len(data)] = data
+            return len(data)
+        return self.stream.readinto(view)
+
+    def _find(self, needle, position):
+        """Index of `needle` at or after `position`, reading more data as needed. None at end of stream."""
+        while True:
+            index = self.buffer.find(needle, position, self.end)
+            if index != -1:
+                return index
+            # Keep searching from just before the old end, in case the needle was split between reads
+            position = max(position, self.end - len(needle) + 1)
+            if not self._read_more():
+                return None
+
+    def _fill(self, size):
+        """Makes sure at least `size` bytes (from the buffer start) are available. False at end of stream."""
+        while self.end < size:
+            if not self._read_more():
+                return False
+        return True
+
+    # ===== Parsing =====
+    def next_frame(self):
+        """
+        Returns a memoryview with the next JPEG's bytes, or None when the stream ends.
+        The view points into the internal buffer and is invalidated by the next call.
+        """
+        self._compact()
+
+        delimiter_index = self._find(self.delimiter, self.start)
+        if delimiter_index is None:
+            return None
+        headers_start = delimiter_index + len(self.delimiter)
+        headers_end = self._find(b'\r\n\r\n', headers_start)
+        if headers_end is None:
+            return None
+
+        content_length = None
+        for line in bytes(self.buffer[headers_start:headers_end]).split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    content_length = None
+
+        body_start = headers_end + 4
+        if content_length is not None:
+            body_end = body_start + content_length
+            if not self._fill(body_end):
+                return None
+        else:
+            # No length header: the part ends at the next delimiter (minus the CRLF before it)
+            next_delimiter = self._find(self.delimiter, body_start)
+            if next_delimiter is None:
+                return None
+            body_end = next_delimiter
+            if self.buffer[body_end - 2:body_end] == b'\r\n':
+                body_end -= 2
+
+        self.start = body_end
+        return memoryview(self.buffer)[body_start:body_end]
+
+
+class FrameRateMeter:
+    """Measures the rate of incoming frames over a sliding window of arrival times."""
+
+    def __init__(self, window=30):
+        self.arrivals = deque(maxlen=window)
+        self.count = 0
+
+    def tick(self, timestamp=None):
+        """Records the arrival of one frame."""
+        self.arrivals.append(time.monotonic() if timestamp is None else timestamp)
+        self.count += 1
+
+    def fps(self):
+        """The measured frame rate, or None until at least two frames arrived."""
+        if len(self.arrivals) < 2:
+            return None
+        elapsed = self.arrivals[-1] - self.arrivals[0]
+        if elapsed <= 0:
+            return None
+        return (len(self.arrivals) - 1) / elapsed
@@ -0,0 +1,170 @@
+import queue
+import threading
+
+
+class FramePipeline:
+    """
+    Runs a frame loop as three stages joined by bounded queues:
+
+        capture thread  ->  process stage (calling thread)  ->  output thread
+
+    Decoding the next frame and writing/emitting the previous one overlap with
+    inference, so the time per frame approaches the slowest stage instead of
+    the sum of all stages. The bounded queues give back-pressure: a fast decoder
+    blocks once it is `queue_size` frames ahead instead of filling memory.
+
+    The process stage runs on the thread that calls `run()`, because that
+    thread owns the MediaPipe graphs and the depth model.
+
+    For live sources `latest_only` replaces a frame that is still waiting for
+    the process stage instead of blocking the capture, so the process stage
+    always starts on the newest frame and latency stays bounded.
+    """
+    _END = object()  # Sentinel that marks the end of the stream
+
+    def __init__(self, read_frame, process_frame, output_frame, queue_size=4, on_idle=None, latest_only=False):
+        """
+        Args:
+            read_frame (callable): Returns the next frame, or None when the stream is finished.
+            process_frame (callable): Takes a frame and returns the item for the output stage (None skips the output).
+            output_frame (callable): Consumes the item returned by `process_frame` (write to file, emit to the UI).
+            queue_size (int): Capacity of each queue between two stages.
+            on_idle (callable): Called by the process stage between frames, e.g. `QCoreApplication.processEvents`.
+            latest_only (bool): Keep only the newest captured frame waiting for the process stage (live sources).
+        """
+        self.read_frame = read_frame
+        self.process_frame = process_frame
+        self.output_frame = output_frame
+        self.on_idle = on_idle
+
+        self.latest_only = latest_only
+        self.dropped_frames = 0 # Frames replaced in the input queue in latest_only mode
+
+        self.input_queue = queue.Queue(maxsize=1 if latest_only else queue_size)
+        self.output_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.errors = []
+
+        self.capture_thread = threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True)
+        self.output_thread = threading.Thread(target=self._output_loop, name="pipeline-output", daemon=True)
+
+    # ===== Queue helpers =====
+    def _put(self, q, item):
+        """Blocking put that gives up when the pipeline is stopped. Returns True if the item was queued."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_latest(self, q, item):
+        """Non-blocking put that replaces the item still waiting in the queue."""
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _put_end(self, q):
+        """Queues the end sentinel; after a stop, pending items are dropped to make room for it."""
+        if self._put(q, self._END):
+            return
+        while True:
+            try:
+                q.put_nowait(self._END)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    # ===== Stages =====
+    def _capture_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                frame = self.read_frame()
+                if frame is None:
+                    break
+                if self.latest_only:
+                    self._put_latest(self.input_queue, frame)
+                elif not self._put(self.input_queue, frame):
+                    break
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+        finally:
+            self._put_end(self.input_queue)
+
+    def _output_loop(self):
+        try:
+            while True:
+                item = self.output_queue.get()
+                if item is self._END:
+                    break
+                self.output_frame(item)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop_event.set()
+
+    def run(self):
+        """
+        Runs the pipeline until the source is exhausted or `stop()` is called.
+        Every queued frame is written before returning; an exception raised in
+        any stage is re-raised here.
+        """
+        self.capture_thread.start()
+        self.output_thread.start()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    frame = self.input_queue.get(timeout=0.01)
+                except queue.Empty:
+                    if self.on_idle:
+                        self.on_idle()
+                    continue
+                if frame is self._END:
+                    break
+
+                result = self.process_frame(frame)
+                if result is not None:
+                    self._put(self.output_queue, result)
+
+                if self.on_idle:
+                    self.on_idle()
+        except Exception:
+            self.stop_event.set()
+            raise
+        finally:
+            # Release the capture thread, then let the output stage finish what is queued
+            self.stop_event.set()
+            self._drain(self.input_queue)
+            self.capture_thread.join()
+            while self.output_thread.is_alive():
+                try:
+                    self.output_queue.put(self._END, timeout=0.05)
+                    break
+                except queue.Full:
+                    continue
+            self.output_thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+    def _drain(self, q):
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return
+
+    def stop(self):
+        """Asks every stage to finish. Safe to call from any thread."""
+        self.stop_event.set()
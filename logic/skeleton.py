@@ -0,0 +1,211 @@
+import cv2
+import numpy as np
+from logic.system_functions import landmark_mapping, connections
+
+# ===== Joint-index table =====
+# Row order of the Skeleton array. It is also the key order of the saved/sent keypoint dicts:
+# the 12 MediaPipe joints, then the 4 calculated ones.
+JOINT_NAMES = tuple(landmark_mapping) + ('hip', 'spine', 'neck', 'head')
+JOINT_INDEX = {name: index for index, name in enumerate(JOINT_NAMES)}
+
+# MediaPipe landmark index of each of the first 12 rows
+MEDIAPIPE_INDICES = np.array([landmark_mapping[name] for name in JOINT_NAMES[:12]])
+
+# Skeleton connections as (start row, end row) pairs
+CONNECTION_INDICES = np.array([(JOINT_INDEX[start], JOINT_INDEX[end]) for start, end in connections])
+
+AXES = {'x': 0, 'y': 1, 'z': 2}
+
+
+# ===== Joint weights =====
+def _joint_weights():
+    """
+    The 16 required joints as fixed linear combinations of the 33 MediaPipe landmarks:
+    (16, 33) weights for x/y and for z. They only differ in the hip row, whose z is
+    (left_hip + right_hip + spine) / 3 (the same formulas as `calculate_extra_landmarks`).
+    """
+    weights_xy = np.zeros((len(JOINT_NAMES), 33))
+    weights_xy[np.arange(12), MEDIAPIPE_INDICES] = 1.0
+
+    averages = {
+        'hip': (23, 24),
+        'spine': (23, 24, 12, 11),
+        'neck': (9, 10, 12, 11),
+        'head': (0, 7, 8),
+    }
+    for name, indices in averages.items():
+        weights_xy[JOINT_INDEX[name], list(indices)] = 1.0 / len(indices)
+
+    weights_z = weights_xy.copy()
+    weights_z[JOINT_INDEX['hip']] = (2 * weights_xy[JOINT_INDEX['hip']] + weights_xy[JOINT_INDEX['spine']]) / 3.0
+    return weights_xy, weights_z
+
+
+JOINT_WEIGHTS_XY, JOINT_WEIGHTS_Z = _joint_weights()
+
+
+def required_joints(landmarks):
+    """
+    Maps MediaPipe landmarks to the 16 required joints with one matrix product.
+
+    Args:
+        landmarks (numpy.ndarray): (33, 3) for one frame or (T, 33, 3) for a whole clip.
+    Returns:
+        numpy.ndarray: (16, 3) or (T, 16, 3) float32 joints in JOINT_NAMES order.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float64)
+    joints = np.empty(landmarks.shape[:-2] + (len(JOINT_NAMES), 3), dtype=np.float32)
+    joints[..., :2] = np.matmul(JOINT_WEIGHTS_XY, landmarks[..., :2])
+    joints[..., 2:] = np.matmul(JOINT_WEIGHTS_Z, landmarks[..., 2:])
+    return joints
+
+
+def keypoint_dicts(joints, has_z=True, decimals=3):
+    """Converts a (T, 16, 3) joints array (e.g. from `required_joints`) to a list of keypoint dicts."""
+    return [Skeleton(frame_joints, has_z).to_dict(decimals) for frame_joints in joints]
+
+
+class Skeleton:
+    """
+    The 16 required keypoints of one person as a (16, 3) float32 array
+    (rows in JOINT_NAMES order, columns x, y, z).
+
+    The geometry (extra joints, denormalization, shifting) works on the whole
+    array at once; dicts are only built by `to_dict()` when the keypoints are
+    saved or sent. For drawing code that expects the old dicts, a Skeleton can
+    also be read like one: `skeleton['hip']['x']`, `skeleton.items()`.
+    """
+
+    __slots__ = ('coords', 'has_z')
+
+    def __init__(self, coords, has_z=True):
+        """
+        Args:
+            coords (numpy.ndarray): (16, 3) array in JOINT_NAMES order.
+            has_z (bool): Whether the z column holds data (False for 2D keypoints).
+        """
+        self.coords = coords
+        self.has_z = has_z
+
+    # ===== Construction =====
+    @classmethod
+    def from_landmarks(cls, landmarks, has_z=True):
+        """
+        Builds the skeleton from MediaPipe's 33 landmarks, e.g.
+        `results.pose_world_landmarks.landmark` (3D) or `results.pose_landmarks.landmark` (2D, has_z=False).
+        """
+        all_landmarks = np.array([(landmark.x, landmark.y, landmark.z) for landmark in landmarks], dtype=np.float32)
+        return cls.from_array(all_landmarks, has_z)
+
+    @classmethod
+    def from_array(cls, all_landmarks, has_z=True):
+        """Builds the skeleton from a (33, 3) array of MediaPipe landmarks."""
+        coords = required_joints(all_landmarks)
+        if not has_z:
+            coords[:, 2] = 0.0
+        return cls(coords, has_z)
+
+    @classmethod
+    def from_dict(cls, keypoints):
+        """Builds the skeleton from a saved/sent keypoints dict."""
+        has_z = all('z' in keypoints[name] for name in JOINT_NAMES)
+        coords = np.zeros((len(JOINT_NAMES), 3), dtype=np.float32)
+        for index, name in enumerate(JOINT_NAMES):
+            joint = keypoints[name]
+            coords[index] = (joint['x'], joint['y'], joint['z'] if has_z else 0.0)
+        return cls(coords, has_z)
+
+    def copy(self):
+        return Skeleton(self.coords.copy(), self.has_z)
+
+    # ===== Geometry =====
+    def position(self, name):
+        """The (x, y, z) row of a joint (a view: writing to it changes the skeleton)."""
+        return self.coords[JOINT_INDEX[name]]
+
+    def denormalize(self, width, height):
+        """Converts normalized image coordinates to pixels, in place."""
+        self.coords[:, 0] *= width
+        self.coords[:, 1] *= height
+        return self
+
+    def shift(self, x=0.0, y=0.0, z=0.0):
+        """Moves every joint by the same offset, in place."""
+        self.coords += np.array((x, y, z), dtype=np.float32)
+        return self
+
+    def pixel_points(self):
+        """(16, 2) integer pixel positions for drawing (after `denormalize`)."""
+        return self.coords[:, :2].astype(np.int32)
+
+    # ===== Boundary =====
+    def to_dict(self, decimals=3):
+        """
+        The keypoints dict that is saved and sent:
+        {'left_shoulder': {'x': .., 'y': .., 'z': .., 'name': 'left_shoulder'}, ...}
+        (without 'z' for 2D keypoints). Values are rounded to `decimals`.
+        """
+        values = np.round(self.coords.astype(np.float64), decimals).tolist()
+        keypoints = {}
+        for name, (x, y, z) in zip(JOINT_NAMES, values):
+            if self.has_z:
+                keypoints[name] = {'x': x, 'y': y, 'z': z, 'name': name}
+            else:
+                keypoints[name] = {'x': x, 'y': y, 'name': name}
+        return keypoints
+
+    # ===== Read-only dict view (for the drawing helpers in system_functions) =====
+    def __getitem__(self, name):
+        return Joint(self, JOINT_INDEX[name])
+
+    def __contains__(self, name):
+        return name in JOINT_INDEX
+
+    def __iter__(self):
+        return iter(JOINT_NAMES)
+
+    def __len__(self):
+        return len(JOINT_NAMES)
+
+    def keys(self):
+        return JOINT_NAMES
+
+    def items(self):
+        return [(name, Joint(self, index)) for index, name in enumerate(JOINT_NAMES)]
+
+
+class Joint:
+    """Dict-like view of one skeleton row: joint['x'], joint['name']."""
+
+    __slots__ = ('skeleton', 'index')
+
+    def __init__(self, skeleton, index):
+        self.skeleton = skeleton
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'name':
+            return JOINT_NAMES[self.index]
+        if key == 'z' and not self.skeleton.has_z:
+            raise KeyError(key)
+        return float(self.skeleton.coords[self.index, AXES[key]])
+
+    def __setitem__(self, key, value):
+        self.skeleton.coords[self.index, AXES[key]] = value
+
+    def __contains__(self, key):
+        return key == 'name' or key in ('x', 'y') or (key == 'z' and self.skeleton.has_z)
+
+
+# ===== Drawing =====
+def draw_landmarks(image, skeleton):
+    """Draws the joints of a denormalized skeleton (same style as `project_landmarks`)."""
+    for x, y in skeleton.pixel_points():
+        cv2.circle(image, (int(x), int(y)), 3, (0, 255, 0), 2)
+
+
+def draw_skeleton(image, skeleton):
+    """Draws the connections of a denormalized skeleton (same style as `project_skeleton`)."""
+    points = skeleton.pixel_points()
+    for start, end in CONNECTION_INDICES:
+        cv2.line(image, tuple(points[start].tolist()), tuple(points[end].tolist()), (255, 0, 0), 2)
@@ -0,0 +1,295 @@
+import math
+import cv2
+import numpy as np
+from logic.filters import MovingAverage
+from logic.skeleton import Skeleton, draw_landmarks, draw_skeleton
+from logic.system_functions import (
+    project_special_values,
+    z_shift_offset,
+    get_norm_x_for_hip,
+    get_norm_hip_point,
+    x_shift_offset,
+)
+
+
+class FramePacket:
+    """Everything the stages know about one frame while it moves through the engine."""
+
+    def __init__(self, frame, timestamp):
+        self.frame = frame              # The frame as read from the source
+        self.timestamp = timestamp      # Seconds (position in a file, wall clock for live sources)
+        self.display_frame = frame      # The frame that is drawn on, shown and written
+        self.inference_frame = frame    # Downscaled copy the models run on (see InferenceFrameStage)
+        self.black_frame = None         # Black background frame with only the skeleton drawn
+        self.depth_frame = None         # Colored depth map for display
+        self.results = None             # MediaPipe results
+        self.keypoints = None           # Skeleton that is saved and broadcast for this frame
+
+
+# ===== Inference resolution =====
+class InferenceFrameStage:
+    """
+    Downscales the frame once for inference; MediaPipe and the depth model both
+    run on this copy. MediaPipe landmarks are normalized, so they map back to
+    the full-resolution frame for drawing and export without any extra work.
+    """
+
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (int): Longer side of the inference frame in pixels (None or 0 keeps the full resolution).
+        """
+        self.max_size = max_size
+        self.cached_shape = None
+        self.cached_size = None
+
+    def _target_size(self, shape):
+        """(width, height) for frames of this shape, or None if they are already small enough."""
+        if shape != self.cached_shape:
+            height, width = shape[:2]
+            scale = self.max_size / max(height, width)
+            self.cached_size = (max(1, round(width * scale)), max(1, round(height * scale))) if scale < 1 else None
+            self.cached_shape = shape
+        return self.cached_size
+
+    def __call__(self, packet):
+        if not self.max_size:
+            return
+        size = self._target_size(packet.frame.shape)
+        if size is not None:
+            # INTER_LINEAR is cheap and plenty for inference inputs
+            packet.inference_frame = cv2.resize(packet.frame, size, interpolation=cv2.INTER_LINEAR)
+
+
+# ===== 2D pose =====
+class Pose2DStage:
+    """Detects and draws 2D landmarks with the MediaProcessor's video model."""
+
+    def __init__(self, get_media_processor, plot_landmarks, plot_skeleton, plot_values, draw_black_background):
+        """
+        Args:
+            get_media_processor (callable): Returns the current MediaProcessor (it can be switched while running).
+            plot_landmarks (bool): Whether to draw landmarks.
+            plot_skeleton (bool): Whether to draw the skeleton.
+            plot_values (bool): Whether to draw the values for (wrists, head, ankles).
+            draw_black_background (bool): Whether to also draw on a black background frame.
+        """
+        self.get_media_processor = get_media_processor
+        self.plot_landmarks = plot_landmarks
+        self.plot_skeleton = plot_skeleton
+        self.plot_values = plot_values
+        self.draw_black_background = draw_black_background
+
+    def __call__(self, packet):
+        processed_frame, skeleton, black_background_frame = self.get_media_processor().process_video_frame(
+            packet.frame, self.plot_landmarks, self.plot_skeleton, self.plot_values, self.draw_black_background,
+            inference_frame=packet.inference_frame,
+        )
+        packet.display_frame = processed_frame
+        packet.black_frame = black_background_frame
+        packet.keypoints = skeleton
+
+
+# ===== 3D pose =====
+class Pose3DStage:
+    """Runs MediaPipe and builds the 16 required 3D (world) keypoints."""
+
+    def __init__(self, get_media_processor, draw_black_background):
+        self.get_media_processor = get_media_processor
+        self.draw_black_background = draw_black_background
+
+    def __call__(self, packet):
+        if self.draw_black_background:
+            packet.black_frame = np.zeros_like(packet.frame)
+
+        results = self.get_media_processor().video_pose.process(cv2.cvtColor(packet.inference_frame, cv2.COLOR_BGR2RGB))
+        packet.results = results
+
+        if results.pose_world_landmarks:
+            packet.keypoints = Skeleton.from_landmarks(results.pose_world_landmarks.landmark)
+
+
+class DepthShiftStage:
+    """
+    Moves the 3D keypoints with the subject: the hip Z from the Depth Anything
+    model shifts every keypoint in depth, and the 2D hip X shifts them sideways.
+
+    The depth model can run on only every `stride`-th frame (and whenever the
+    hip moved more than `motion_threshold` in the image since the last depth
+    frame). The hip Z of the frames in between is interpolated between depth
+    frames when the next one is already known (offline batches), and
+    extrapolated from the last two otherwise.
+    """
+
+    def __init__(self, get_model, use_depth_model, display_depth_map, colorize_depth, input_size=518, stride=1, motion_threshold=None, hip_z_filter=None):
+        """
+        Args:
+            get_model (callable): Returns the current DepthAnythingV2 model (it may change during
+                the capture; the hip Z then continues from the old model's last value).
+            use_depth_model (bool): Whether to run the depth model for the hip Z.
+            display_depth_map (bool): Whether to produce a colored depth map for display.
+            colorize_depth (callable): Turns a raw depth map into a BGR image.
+            input_size (int): The depth network's input resolution (multiple of 14).
+            stride (int): Run the depth model on every Nth frame with keypoints (1 = every frame).
+            motion_threshold (float): Also run it when the 2D hip moved further than this
+                (normalized image units) since the last depth frame. None disables it.
+            hip_z_filter (callable): Streaming filter (see logic.filters) that smooths the hip Z;
+                defaults to a moving average over the last 10 values.
+        """
+        self.get_model = get_model
+        self.input_size = input_size
+        self.stride = max(1, stride)
+        self.motion_threshold = motion_threshold
+        self.use_depth_model = use_depth_model
+        self.display_depth_map = display_depth_map
+        self.colorize_depth = colorize_depth
+
+        self.hip_z_filter = hip_z_filter if hip_z_filter is not None else MovingAverage(10)
+        self.first_z = None
+        self.colored_map = None
+        self.model = None                 # Model of the last depth frame
+        self.depth_bias = 0.0             # Added to the current model's values after a model switch
+
+        self.frames_since_depth = None    # None until the first depth frame
+        self.last_depth_point = None      # 2D hip position at the last depth frame
+        self.depth_samples = []           # (timestamp, hip Z) of the last two depth frames
+        self.keypoints_lost = False       # Whether the last packet had no keypoints
+
+    def __call__(self, packet):
+        self.process_batch([packet])
+
+    def process_batch(self, packets):
+        """Runs the depth model once for the packets that need it, then shifts all of them in order."""
+        hip_depths = [None] * len(packets)
+        depth_maps = [None] * len(packets)
+        if self.use_depth_model:
+            with_keypoints = [i for i, packet in enumerate(packets) if packet.keypoints is not None]
+            # The first frame with keypoints after frames without them starts over: the old
+            # depth frames say nothing about where the subject is now
+            restarts = {i for i in with_keypoints if (packets[i - 1].keypoints is None if i > 0 else self.keypoints_lost)}
+            if packets:
+                self.keypoints_lost = packets[-1].keypoints is None
+            indices = [i for i in with_keypoints if self.needs_depth(packets[i], restart=i in restarts)]
+            if indices:
+                model = self.get_model()
+                frames = [packets[i].inference_frame for i in indices]
+                size = frames[0].shape[:2]
+                depth = model.infer_low_res(frames, self.input_size)
+
+                # Only the hip is needed, so it is read straight from the network output at the
+                # 2D hip in the image (the keypoints are in meters); the full-size map is built just for display
+                hip_points = [[get_norm_hip_point(packets[i].results)] for i in indices]
+                values = model.sample_depth(depth, hip_points, size)[:, 0]
+                if model is not self.model:
+                    if self.model is not None and self.depth_samples:
+                        # The model was switched mid-capture: different models give different depth
+                        # values, so rebase the new one on the old one's last value instead of jumping
+                        self.depth_bias = self.depth_samples[-1][1] - float(values[0])
+                    self.model = model
+                values = values + self.depth_bias
+                maps = model.upsample_depth(depth, size) if self.display_depth_map else [None] * len(indices)
+                for i, value, depth_map in zip(indices, values, maps):
+                    hip_depths[i] = float(round(value, 3))
+                    depth_maps[i] = depth_map
+
+            # Fill in the frames the depth model skipped
+            for i in with_keypoints:
+                timestamp = packets[i].timestamp
+                if i in restarts:
+                    self.depth_samples = []
+                if hip_depths[i] is not None:
+                    self.depth_samples = (self.depth_samples + [(timestamp, hip_depths[i])])[-2:]
+                    continue
+                following = next((j for j in indices if j > i), None)
+                if following is not None and following not in restarts:
+                    hip_depths[i] = self.interpolate_hip_z(timestamp, (packets[following].timestamp, hip_depths[following]))
+                else:
+                    hip_depths[i] = self.interpolate_hip_z(timestamp)
+
+        for packet, hip_z, depth_map in zip(packets, hip_depths, depth_maps):
+            self.apply(packet, hip_z, depth_map)
+
+    def needs_depth(self, packet, restart=False):
+        """
+        Whether the depth model has to run for this packet (stride or hip motion).
+        `restart` forces it, for the first frame with keypoints after frames without them.
+        """
+        point = get_norm_hip_point(packet.results) if packet.results is not None and packet.results.pose_landmarks else None
+        due = restart or self.frames_since_depth is None or self.frames_since_depth + 1 >= self.stride
+        moved = (self.motion_threshold is not None and point is not None and self.last_depth_point is not None
+                 and math.dist(point, self.last_depth_point) > self.motion_threshold)
+        if due or moved:
+            self.frames_since_depth = 0
+            self.last_depth_point = point
+            return True
+        self.frames_since_depth += 1
+        return False
+
+    def interpolate_hip_z(self, timestamp, following=None):
+        """
+        Hip Z for a frame without a depth frame: linear between the last depth frame and
+        `following` (timestamp, z) if given, else extrapolated from the last two depth frames.
+        The extrapolation goes at most one depth interval (the time between the last two
+        depth frames) past the last one and holds its value from there (e.g. while the
+        depth model is late or stalled).
+        """
+        if not self.depth_samples:
+            return following[1] if following else None
+        if following is not None:
+            (t0, z0), (t1, z1) = self.depth_samples[-1], following
+        elif len(self.depth_samples) == 2:
+            (t0, z0), (t1, z1) = self.depth_samples
+            timestamp = min(timestamp, t1 + (t1 - t0))
+        else:
+            return self.depth_samples[-1][1]
+        if t1 <= t0:
+            return z1
+        return float(round(z0 + (z1 - z0) * (timestamp - t0) / (t1 - t0), 3))
+
+    def apply(self, packet, hip_z, depth_map=None):
+        """Shifts the packet's keypoints with the hip depth (None when the depth model is off)."""
+        if packet.keypoints is None:
+            packet.depth_frame = self.colored_map # Keep showing the last depth map
+            return
+
+        skeleton = packet.keypoints
+        if hip_z is not None:
+            if self.first_z is None:
+                self.first_z = hip_z
+
+            # Smooth the hip Z (constant memory, however long the session runs)
+            hip_z_smoothed = float(round(self.hip_z_filter(hip_z, packet.timestamp), 3))
+            skeleton.shift(z=z_shift_offset(hip_z_smoothed, self.first_z))
+
+            if depth_map is not None:
+                self.colored_map = self.colorize_depth(depth_map)
+
+        norm_hip_x = get_norm_x_for_hip(packet.results)
+        skeleton.shift(x=x_shift_offset(norm_hip_x, packet.display_frame))
+        packet.depth_frame = self.colored_map
+
+
+class Draw3DStage:
+    """Draws the skeleton (from the 2D landmarks) and the 3D values onto the frames."""
+
+    def __init__(self, plot_landmarks_skeleton, plot_values):
+        self.plot_landmarks_skeleton = plot_landmarks_skeleton
+        self.plot_values = plot_values
+
+    def __call__(self, packet):
+        if packet.keypoints is None or not (self.plot_landmarks_skeleton or self.plot_values):
+            return
+
+        height, width = packet.display_frame.shape[:2]
+        skeleton_2d = Skeleton.from_landmarks(packet.results.pose_landmarks.landmark, has_z=False).denormalize(width, height)
+
+        targets = [packet.display_frame]
+        if packet.black_frame is not None:
+            targets.append(packet.black_frame)
+
+        for image in targets:
+            if self.plot_landmarks_skeleton:
+                draw_landmarks(image, skeleton_2d)
+                draw_skeleton(image, skeleton_2d)
+            if self.plot_values:
+                project_special_values(image, skeleton_2d, packet.keypoints)
@@ -527,10 +527,23 @@ def shifting_keypoints_with_z_value(landmark_3d, z_value, first_z):
         z_value (float): Z value from the depth estimation model
     """
     
-    z_value = (z_value - first_z) * 8
+    z_value = z_shift_offset(z_value, first_z)
     
     for name, landmark in landmark_3d.items():
         landmark['z'] = round(landmark['z'] + z_value, 3)
+
+
+def z_shift_offset(z_value, first_z):
+    """The Z offset that moves the keypoints with the hip depth (relative to the first depth value).
+
+    Args:
+        z_value (float): Z value from the depth estimation model
+        first_z (float): the first Z value of the session
+    
+    Returns:
+        offset (float): the offset to add to every keypoint's z
+    """
+    return (z_value - first_z) * 8
         
         
 def get_norm_x_for_hip(results):
@@ -548,7 +561,22 @@ def get_norm_x_for_hip(results):
     
     normalized_hip_x = (left_up_x + reight_up_x) / 2
 
-    return normalized_hip_x    
+    return normalized_hip_x
+
+
+def get_norm_hip_point(results):
+    """Normalized 2D (x, y) image position of the hip center from MediaPipe results.
+    
+    Args:
+        results (MediaPipe results): the results from the MediaPipe model
+    
+    Returns:
+        (x, y) (tuple): the hip center in normalized image coordinates
+    """
+    left_hip = results.pose_landmarks.landmark[23]
+    right_hip = results.pose_landmarks.landmark[24]
+    
+    return ((left_hip.x + right_hip.x) / 2, (left_hip.y + right_hip.y) / 2)    
     
 def shifting_keypoints_with_x_value(norm_hip_x, frame, landmarks_3d):
     """Shifting all keypoints based on the x of hip value
@@ -558,10 +586,23 @@ def shifting_keypoints_with_x_value(norm_hip_x, frame, landmarks_3d):
         frame (image): the frame that we show on the app
         landmarks_3d (dict): 3d landmarks
     """
-    h, w, _ = frame.shape
-    center = ((w/1.2) / 2)
-    denorm_hip_x = ((norm_hip_x * (w/1.2)) - center) / 100
+    denorm_hip_x = x_shift_offset(norm_hip_x, frame)
     
     for name, landmark in landmarks_3d.items():
         landmark['x'] = round(landmark['x'] + denorm_hip_x, 3)
 
+
+def x_shift_offset(norm_hip_x, frame):
+    """The X offset that moves the keypoints sideways with the 2D hip position.
+
+    Args:
+        norm_hip_x (float): normalized hip x keypoint
+        frame (image): the frame that we show on the app
+    
+    Returns:
+        offset (float): the offset to add to every keypoint's x
+    """
+    h, w = frame.shape[:2]
+    center = ((w/1.2) / 2)
+    return ((norm_hip_x * (w/1.2)) - center) / 100
+
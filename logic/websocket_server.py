@@ -1,22 +1,320 @@
 import asyncio
 import websockets
 import json
+import socket
+import struct
 import threading
+import time
 from collections import deque
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from logic.skeleton import JOINT_NAMES, Skeleton
+
+# ===== Binary frame format =====
+# Clients that ask for it (see KeypointServer) get every frame as one binary message:
+#   header (little-endian, 20 bytes): magic b'KPT1', uint32 sequence, float64 timestamp (seconds),
+#                                     uint16 joint count, uint8 flags (bit 0: has z), uint8 reserved
+#   body: joint count x 3 float32 (x, y, z per joint, in the joint order sent in the hello message)
+BINARY_MAGIC = b'KPT1'
+BINARY_HEADER = struct.Struct('<4sIdHBx')
+FLAG_HAS_Z = 1
+PROTOCOL_VERSION = 1
+
+
+def encode_binary_frame(skeleton, sequence, timestamp):
+    """Packs a Skeleton into one binary frame message."""
+    flags = FLAG_HAS_Z if skeleton.has_z else 0
+    header = BINARY_HEADER.pack(BINARY_MAGIC, sequence & 0xFFFFFFFF, timestamp, len(skeleton.coords), flags)
+    return header + np.ascontiguousarray(skeleton.coords, dtype='<f4').tobytes()
+
+
+def decode_binary_frame(message):
+    """Unpacks a binary frame message. Returns (sequence, timestamp, (joints, 3) float32 array, has_z)."""
+    magic, sequence, timestamp, joint_count, flags = BINARY_HEADER.unpack_from(message)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a keypoint frame.")
+    joints = np.frombuffer(message, dtype='<f4', count=joint_count * 3, offset=BINARY_HEADER.size).reshape(joint_count, 3)
+    return sequence, timestamp, joints, bool(flags & FLAG_HAS_Z)
+
+
+def hello_message(fmt):
+    """The message that confirms a client's format and tells it the joint order."""
+    return json.dumps({
+        'type': 'hello',
+        'version': PROTOCOL_VERSION,
+        'format': fmt,
+        'joints': list(JOINT_NAMES),
+        'header': 'magic:4s,sequence:u32,timestamp:f64,joint_count:u16,flags:u8,reserved:u8',
+    })
+
+
+def parse_channels(value):
+    """'webcam,phone' or ['webcam', 'phone'] -> set of channel names; None, '' or '*' -> None (all channels)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    channels = {str(channel).strip() for channel in value if str(channel).strip()}
+    if not channels or '*' in channels:
+        return None
+    return channels
+
+
+class LatencyHistogram:
+    """Counts latencies into fixed log-spaced buckets (constant memory) and summarizes them."""
+
+    # Upper bucket edges in milliseconds; the last bucket takes everything above
+    BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        for index, edge in enumerate(self.BUCKETS_MS):
+            if ms <= edge:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bucket edge (ms) below which `fraction` of the samples fall."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for edge, count in zip(self.BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(edge, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        if not self.count:
+            return "no samples"
+        lines = [f"{self.count} samples, mean {self.total_ms / self.count:.3f} ms, "
+                 f"p50 <= {self.percentile(0.5):g} ms, p99 <= {self.percentile(0.99):g} ms, max {self.max_ms:.3f} ms"]
+        lower = 0.0
+        for edge, count in zip(self.BUCKETS_MS, self.counts):
+            if count:
+                lines.append(f"  {lower:g}-{edge:g} ms: {count}")
+            lower = edge
+        return "\n".join(lines)
+
+
+class ClientConnection:
+    """
+    One connected client: its format, a small send queue and its send stats.
+
+    Each client has its own sender task. The queue holds at most `queue_size`
+    frames; when a new frame arrives and it is full, the oldest one is dropped
+    (latest pose wins). A slow client only loses its own frames, it can't delay
+    the other clients or make the server's memory grow.
+    """
+    def __init__(self, websocket, fmt='json', queue_size=2):
+        self.websocket = websocket
+        self.format = fmt
+        self.channels = None        # Channel names the client subscribed to (None = all)
+        self.control = False        # Whether it gets session start/stop messages (it spoke the hello protocol)
+        self.queue_size = queue_size
+        self.queue = deque()        # (message, enqueued perf_counter time, droppable)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.rtt_ms = None          # Last ping round trip
+        self.latency = LatencyHistogram()  # Time from broadcast() to the message being sent
+
+    @property
+    def address(self):
+        return self.websocket.remote_address
+
+    def wants(self, channel):
+        return self.channels is None or channel in self.channels
+
+    def put(self, message, enqueued, droppable=True):
+        """
+        Queues a message. Frames are droppable: if the queue is full, the oldest
+        frame is dropped. Control messages (droppable=False) are always delivered.
+        """
+        if len(self.queue) >= self.queue_size:
+            for index, (_, _, queued_droppable) in enumerate(self.queue):
+                if queued_droppable:
+                    del self.queue[index]
+                    self.dropped += 1
+                    break
+        self.queue.append((message, enqueued, droppable))
+        self.ready.set()
+
+    async def send_loop(self, on_sent):
+        """
+        Sends queued frames to the client, one at a time, until cancelled. A send waits
+        while the connection's write buffer is over the server's write_limit, so a slow
+        client's frames wait in the queue, where newer ones replace them.
+        """
+        while True:
+            await self.ready.wait()
+            while self.queue:
+                message, enqueued, _ = self.queue.popleft()
+                await self.websocket.send(message)
+                elapsed = time.perf_counter() - enqueued
+                self.latency.record(elapsed)
+                on_sent(elapsed)
+                self.sent += 1
+            self.ready.clear()
+
+    async def ping_loop(self, interval):
+        """Measures the round trip time with a WebSocket ping every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            pong = await self.websocket.ping()
+            self.rtt_ms = await pong * 1000.0
+
+    def stats(self):
+        return {
+            'address': self.address,
+            'format': self.format,
+            'channels': sorted(self.channels) if self.channels else '*',
+            'queued': len(self.queue),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'rtt_ms': self.rtt_ms,
+            'p99_ms': self.latency.percentile(0.99),
+        }
+
+    def describe(self):
+        rtt = f"{self.rtt_ms:.1f} ms" if self.rtt_ms is not None else "n/a"
+        return (f"{self.address} ({self.format}): {self.sent} sent, {self.dropped} dropped, "
+                f"{len(self.queue)} queued, rtt {rtt}, p99 <= {self.latency.percentile(0.99):g} ms")
+
+
+class KeypointSession:
+    """
+    One capture session published on a channel of a KeypointServer.
+
+    It has the same `broadcast()` as the server, so it can be given to the
+    ProcessingEngine in its place. Clients subscribed to the channel get a
+    `session_start` message before the first frame and a `session_stop`
+    message after the last one.
+    """
+    def __init__(self, server, session_id, channel, info=None):
+        self.server = server
+        self.id = session_id
+        self.channel = channel
+        self.info = info or {}
+        self.frames = 0
+        self.started = time.time()
+        self.active = True
+
+    def broadcast(self, data, timestamp=0.0):
+        if self.active:
+            self.frames += 1
+            self.server.broadcast(data, timestamp, channel=self.channel)
+
+    def stop(self):
+        """Ends the session (sends `session_stop`)."""
+        self.server.end_session(self)
+
+    def control_message(self, kind):
+        message = {
+            'type': kind,
+            'session': self.id,
+            'channel': self.channel,
+            'time': time.time(),
+        }
+        if kind == 'session_start':
+            message['info'] = self.info
+        else:
+            message['frames'] = self.frames
+            message['duration'] = round(time.time() - self.started, 3)
+        return json.dumps(message)
+
 
 class KeypointServer:
     """
     A WebSocket server that broadcasts keypoint data to all connected clients.
     It runs in a separate thread to avoid blocking the main application.
+
+    Every client gets JSON text messages (the keypoints dict) unless it asks for
+    the binary format, either with `?format=binary` in the URL or by sending
+    `{"type": "hello", "format": "binary"}`. The server then answers with a hello
+    message holding the joint order, once, and sends binary frames from then on.
+
+    Every client has its own bounded queue and sender task (see ClientConnection),
+    so a slow client drops its own oldest frames instead of stalling the others.
+
+    The server is meant to stay up across processing runs. Each run is a
+    session (`start_session()`) on a channel such as 'webcam' or 'video'.
+    Clients can subscribe to some channels with `?channel=webcam,phone` or
+    `{"type": "hello", "channels": [...]}` (default: all). Clients that use the
+    hello protocol (binary format, a channel query or a hello message) also get
+    `session_start`/`session_stop` JSON messages; plain JSON clients only get
+    keypoints, as before.
     """
-    def __init__(self, port):
+    def __init__(self, port, client_queue_size=2, ping_interval=2.0, write_limit=4096):
+        """
+        Args:
+            port (int): Port to listen on.
+            client_queue_size (int): Frames kept per client before the oldest is dropped.
+            ping_interval (float): Seconds between round-trip measurements per client.
+            write_limit (int): Bytes a client's connection may buffer (in the transport and
+                the socket each) before sends wait; frames that arrive meanwhile queue up and
+                are dropped, so keep it to a few frames.
+        """
         self.port = port
         self.host = '0.0.0.0'     #'localhost'
-        self.clients = set()
-        self.server_thread = threading.Thread(target=self._start_server)
+        self.client_queue_size = client_queue_size
+        self.write_limit = write_limit
+        self.ping_interval = ping_interval
+        self.clients = set()      # ClientConnection objects
+        self.format_counts = {'json': 0, 'binary': 0}
+        self.server_thread = threading.Thread(target=self._start_server, daemon=True)
+        self.started = threading.Event()  # Set once the server listens (or failed to)
         self.loop = None
         self.server = None  # To hold the server object
-        self.message_queue = deque()
+        self.accepting = False     # True while broadcast() may hand messages to the loop
+        self.sequence = 0
+        self.session_count = 0
+        self.sessions = {}         # Active sessions by id (only used on the server loop)
+        self.latency = LatencyHistogram()  # Time from broadcast() to the message being sent, all clients
+
+    # ===== Clients =====
+    def _set_format(self, client, fmt):
+        if client in self.clients:
+            self.format_counts[client.format] -= 1
+            self.format_counts[fmt] += 1
+        client.format = fmt
+
+    async def _negotiate(self, client, message):
+        """Handles a hello message from the client. Returns True if it was one."""
+        if not isinstance(message, str):
+            return False
+        try:
+            request = json.loads(message)
+        except ValueError:
+            return False
+        if not isinstance(request, dict) or request.get('type') != 'hello':
+            return False
+        fmt = 'binary' if request.get('format') == 'binary' else 'json'
+        # The hello goes out before any frame in the new format
+        await client.websocket.send(hello_message(fmt))
+        if fmt != client.format:
+            client.queue.clear()
+            self._set_format(client, fmt)
+        if 'channels' in request:
+            client.channels = parse_channels(request['channels'])
+        if not client.control:
+            client.control = True
+            self._send_active_sessions(client)
+        return True
+
+    def client_stats(self):
+        """Per-client stats: address, format, queued, sent, dropped, rtt_ms, p99_ms."""
+        return [client.stats() for client in self.clients]
 
     async def _handler(self, websocket):
         """
@@ -24,43 +322,104 @@ class KeypointServer:
         of connected clients and keeps the connection alive.
         """
         print(f"Unity client connected from {websocket.remote_address}")
-        self.clients.add(websocket)
+        # A slow client must stall its own send loop, where old frames are dropped, instead of
+        # having them piled up unseen in the socket buffer (hundreds of KB by default)
+        sock = websocket.transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.write_limit)
+        client = ClientConnection(websocket, queue_size=self.client_queue_size)
+        query = parse_qs(urlparse(websocket.request.path).query) if websocket.request else {}
+        if query.get('format', ['json'])[0] == 'binary':
+            client.format = 'binary'
+            client.control = True
+            await websocket.send(hello_message('binary'))
+        if 'channel' in query:
+            client.channels = parse_channels(query['channel'][0])
+            client.control = True
+        self.clients.add(client)
+        self.format_counts[client.format] += 1
+        if client.control:
+            self._send_active_sessions(client)
+        tasks = [asyncio.create_task(client.send_loop(self.latency.record))]
+        if self.ping_interval:
+            tasks.append(asyncio.create_task(client.ping_loop(self.ping_interval)))
         try:
-            # Keep the connection open and listen for any potential messages
+            # Keep the connection open and listen for format requests
             # or disconnection events from the client.
             async for message in websocket:
-                pass
+                await self._negotiate(client, message)
         except websockets.exceptions.ConnectionClosed:
-            print("Unity client disconnected.")
+            pass
         finally:
-            self.clients.remove(websocket)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.clients.remove(client)
+            self.format_counts[client.format] -= 1
+            print(f"Unity client disconnected: {client.describe()}")
+
+    def _dispatch(self, messages, enqueued, channel=None):
+        """Runs on the server loop: hands a frame to every client's queue without waiting for sends."""
+        for client in self.clients:
+            message = messages.get(client.format)
+            if message is not None and (channel is None or client.wants(channel)):
+                client.put(message, enqueued)
 
-    async def _broadcast_loop(self):
+    # ===== Sessions =====
+    def _send_active_sessions(self, client):
+        """Tells a client that just joined about the sessions already running on its channels."""
+        for session in self.sessions.values():
+            if client.wants(session.channel):
+                client.put(session.control_message('session_start'), time.perf_counter(), droppable=False)
+
+    def _publish_control(self, session, kind):
+        """Runs on the server loop: records the session change and tells the subscribed clients."""
+        if kind == 'session_start':
+            self.sessions[session.id] = session
+        else:
+            self.sessions.pop(session.id, None)
+        message = session.control_message(kind)
+        enqueued = time.perf_counter()
+        for client in self.clients:
+            if client.control and client.wants(session.channel):
+                client.put(message, enqueued, droppable=False)
+
+    def start_session(self, channel='default', info=None):
         """
-        Continuously checks the queue for new messages and broadcasts them.
+        Starts a capture session on a channel. Can be called from any thread.
+
+        Args:
+            channel (str): Channel name, e.g. 'webcam', 'phone' or 'video'.
+            info (dict): Extra fields for the session_start message (must be JSON-serializable).
+        Returns:
+            KeypointSession: Broadcast the session's frames through it and `stop()` it at the end.
         """
-        try:
-            while True:
-                if self.message_queue:
-                    message = self.message_queue.popleft()
-                    if self.clients:
-                        # Use asyncio.gather to send messages to all clients concurrently.
-                        await asyncio.gather(
-                            *[client.send(message) for client in self.clients]
-                        )
-                await asyncio.sleep(0.001)  # Sleep briefly to yield control
-        except asyncio.CancelledError:
-            print("Broadcast loop cancelled.")
+        self.session_count += 1
+        session = KeypointSession(self, self.session_count, channel, info)
+        if self.accepting:
+            self.loop.call_soon_threadsafe(self._publish_control, session, 'session_start')
+        print(f"Keypoint session {session.id} started on channel '{channel}'.")
+        return session
+
+    def end_session(self, session):
+        """Ends a session started with `start_session()`. Can be called from any thread."""
+        if not session.active:
+            return
+        session.active = False
+        if self.accepting:
+            self.loop.call_soon_threadsafe(self._publish_control, session, 'session_stop')
+        print(f"Keypoint session {session.id} on channel '{session.channel}' ended after {session.frames} frames.")
 
     async def _main(self):
-        """The main async method to run the server and broadcast loop."""
-        self.server = await websockets.serve(self._handler, self.host, self.port)
+        """The main async method to run the server."""
+        self.server = await websockets.serve(self._handler, self.host, self.port, write_limit=self.write_limit)
         print(f"WebSocket server is running on ws://{self.host}:{self.port}")
-        broadcast_task = asyncio.create_task(self._broadcast_loop())
+        self.accepting = True
+        self.started.set()
         try:
             await self.server.wait_closed()
         finally:
-            broadcast_task.cancel()
+            self.accepting = False
 
     def _start_server(self):
         """
@@ -74,28 +433,50 @@ class KeypointServer:
         except Exception as e:
             print(f"Error in server's main loop: {e}")
         finally:
+            self.started.set()
             self.loop.close()
             print("Server loop closed.")
 
-    def start(self):
-        """Starts the server thread."""
+    def start(self, timeout=5):
+        """Starts the server thread and waits until it listens. Returns True if it does."""
         self.server_thread.start()
         # The print statement is moved to _main to ensure it prints when the server is actually running.
+        self.started.wait(timeout)
+        return self.accepting
+
+    def is_running(self):
+        return self.accepting and self.server_thread.is_alive()
 
     def stop(self):
         """Stops the server and the event loop."""
+        self.accepting = False
         if self.server and self.loop:
             self.loop.call_soon_threadsafe(self.server.close)
         print("WebSocket server stopping...")
         self.server_thread.join(timeout=2) # Wait for the thread to finish
+        print(f"Broadcast latency (enqueue -> sent): {self.latency.summary()}")
 
-    def broadcast(self, data):
+    def broadcast(self, data, timestamp=0.0, channel=None):
         """
-        Adds keypoint data to the message queue to be broadcast.
+        Hands keypoint data to the clients' send queues.
         This method is called from the main processing thread.
+
+        Args:
+            data: A Skeleton, or a keypoints dict.
+            timestamp (float): The frame's time in seconds (sent in binary frames).
+            channel (str): Only send to clients subscribed to this channel (None = all clients).
         """
         try:
-            message = json.dumps(data)
-            self.message_queue.append(message)
+            self.sequence += 1
+            # Only encode the formats that someone is listening to
+            messages = {'json': None, 'binary': None}
+            if self.format_counts['json'] > 0:
+                messages['json'] = json.dumps(data.to_dict() if isinstance(data, Skeleton) else data)
+            if self.format_counts['binary'] > 0:
+                skeleton = data if isinstance(data, Skeleton) else Skeleton.from_dict(data)
+                messages['binary'] = encode_binary_frame(skeleton, self.sequence, timestamp or 0.0)
+            if (messages['json'] is not None or messages['binary'] is not None) and self.accepting:
+                # Wakes the server loop right away; the clients' sender tasks do the sending
+                self.loop.call_soon_threadsafe(self._dispatch, messages, time.perf_counter(), channel)
         except Exception as e:
-            print(f"Error serializing data for broadcast: {e}") 
\ No newline at end of file
+            print(f"Error serializing data for broadcast: {e}")
@@ -0,0 +1,96 @@
+"""
+Compares video decode settings (backend, threads, reduced size, frame step)
+on a generated synthetic test video.
+
+Usage (from the project root):
+    python -m tools.benchmark_decode
+    python -m tools.benchmark_decode --width 3840 --height 2160 --frames 120
+    python -m tools.benchmark_decode --video path/to/recording.mp4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from logic.frame_sources import DecodeOptions, VideoFileSource
+
+
+def generate_test_video(path, width, height, frames, fps=30):
+    """Writes a synthetic video with moving shapes and noise so the encoder can't cheat."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not create test video: {path}")
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 40, size=(height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = noise.copy()
+        x = int((i / frames) * (width - height // 4))
+        cv2.rectangle(frame, (x, height // 3), (x + height // 4, height // 3 + height // 4), (0, 200, 255), -1)
+        cv2.circle(frame, (width // 2, height // 2), int(height / 6 + 20 * np.sin(i / 5)), (255, 80, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def time_decode(video_path, options):
+    """Decodes the whole file with the given options. Returns (frames, seconds, backend, frame shape)."""
+    source = VideoFileSource(video_path, options)
+    source.open()
+    try:
+        frames = 0
+        shape = None
+        start = time.perf_counter()
+        while (item := source.read()) is not None:
+            frames += 1
+            shape = item[0].shape
+        elapsed = time.perf_counter() - start
+        return frames, elapsed, source.backend_name(), shape
+    finally:
+        source.release()
+
+
+def default_configs(max_size):
+    available = [name for name, api in DecodeOptions.backends.items()
+                 if name == 'any' or cv2.videoio_registry.hasBackend(api)]
+    configs = []
+    for backend in available:
+        for threads in (1, 0):
+            configs.append(DecodeOptions(backend=backend, threads=threads))
+    configs.append(DecodeOptions(threads=0, hw_acceleration=True))
+    configs.append(DecodeOptions(threads=0, max_size=max_size))
+    configs.append(DecodeOptions(threads=0, frame_step=2))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help="Benchmark this file instead of a generated one")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--frames', type=int, default=150)
+    parser.add_argument('--max-size', type=int, default=960, help="Longer side for the reduced-size configuration")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(tmp_dir, 'synthetic.mp4')
+            print(f"Generating {args.frames} frames at {args.width}x{args.height}...")
+            generate_test_video(video_path, args.width, args.height, args.frames)
+
+        print(f"{'configuration':<100} {'backend':<10} {'frames':>6} {'fps':>8}  output")
+        for options in default_configs(args.max_size):
+            try:
+                frames, elapsed, backend, shape = time_decode(video_path, options)
+            except RuntimeError as e:
+                print(f"{options!r:<100} failed: {e}")
+                continue
+            fps = frames / elapsed if elapsed > 0 else float('inf')
+            size = f"{shape[1]}x{shape[0]}" if shape else "-"
+            print(f"{options!r:<100} {backend or '-':<10} {frames:>6} {fps:>8.1f}  {size}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures Depth Anything V2 throughput for different batch sizes
+(the batched offline depth mode for video files).
+
+Uses the checkpoint from logic/checkpoints if it exists, otherwise random
+weights (the speed is the same).
+
+Usage (from the project root):
+    python -m tools.benchmark_depth_batch
+    python -m tools.benchmark_depth_batch --encoder vits --batch-sizes 1 4 8 --frames 32 --device cpu
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from logic.depth_anything_v2.dpt import DepthAnythingV2
+from logic.depth_model import MODEL_CONFIGS, checkpoint_path, load_depth_model
+
+
+def load_model(encoder, device):
+    path = checkpoint_path(encoder)
+    if os.path.exists(path):
+        model = load_depth_model(encoder, device, path)
+        print(f"Loaded {path}")
+        return model
+    print(f"{path} not found, using random weights")
+    return DepthAnythingV2(**MODEL_CONFIGS[encoder]).to(device).eval()
+
+
+def time_batches(model, frames, batch_size, input_size):
+    """Runs all frames through the model in batches. Returns frames per second."""
+    model.infer_batch(frames[:batch_size], input_size) # Warm-up
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        batch = frames[i:i + batch_size]
+        if batch_size == 1:
+            model.infer_image(batch[0], input_size)
+        else:
+            model.infer_batch(batch, input_size)
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--encoder', default='vits', choices=MODEL_CONFIGS)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=540)
+    parser.add_argument('--input-size', type=int, default=518)
+    args = parser.parse_args()
+
+    model = load_model(args.encoder, args.device)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, size=(args.height, args.width, 3), dtype=np.uint8) for _ in range(args.frames)]
+
+    print(f"{args.frames} frames of {args.width}x{args.height}, encoder {args.encoder}, device {args.device}, {torch.get_num_threads()} threads")
+    print(f"{'batch':>5} {'fps':>8} {'speedup':>8}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        fps = time_batches(model, frames, batch_size, args.input_size)
+        baseline = baseline or fps
+        print(f"{batch_size:>5} {fps:>8.2f} {fps / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
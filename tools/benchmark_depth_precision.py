@@ -0,0 +1,135 @@
+"""
+Accuracy vs. speed of the Depth Anything V2 inference precisions
+(see DepthAnythingV2.set_precision): fp32, bf16 autocast and int8 dynamic
+quantization. Every precision runs on the same fixed frames; the hip depth
+it gives (read at the MediaPipe hip, like the depth modes do) is compared
+with fp32, both raw and as the Z shift applied to the keypoints.
+
+Uses the frames of --video if given, otherwise fixed synthetic frames (the
+speed is the same, but only real footage gives meaningful accuracy numbers).
+Without a checkpoint the model has random weights; the accuracy numbers are
+then meaningless too.
+
+Usage (from the project root):
+    python -m tools.benchmark_depth_precision --video my_clip.mp4
+    python -m tools.benchmark_depth_precision --encoder vits --precisions fp32 bf16 int8 --frames 16
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from logic.depth_anything_v2.dpt import DepthAnythingV2, PRECISIONS
+from logic.depth_model import MODEL_CONFIGS, checkpoint_path, load_depth_model
+from logic.system_functions import get_norm_hip_point, z_shift_offset
+
+
+def read_frames(video_path, count):
+    """`count` frames spread evenly over the video."""
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for index in np.linspace(0, max(total - 1, 0), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = cap.read()
+        if ok:
+            frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"Could not read frames from {video_path}")
+    return frames
+
+
+def synthetic_frames(count, width, height):
+    """Fixed frames: a smooth gradient scene with a bright blob moving across it, plus noise."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = []
+    for i in range(count):
+        cx, cy = width * (0.3 + 0.4 * i / max(count - 1, 1)), height * 0.55
+        blob = np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * (height / 6) ** 2))
+        base = 80 + 120 * (y / height)[..., None] * np.array([0.6, 0.8, 1.0]) + 100 * blob[..., None]
+        noise = rng.normal(0, 6, size=(height, width, 3))
+        frames.append(np.clip(base + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def hip_points(frames):
+    """Normalized hip position per frame from MediaPipe (the frame center where no person is found)."""
+    try:
+        from logic.media_processor import create_pose
+        pose = create_pose(1, True)
+    except Exception as e:
+        print(f"MediaPipe not available ({e}), sampling the frame centers")
+        return [(0.5, 0.5)] * len(frames)
+    points = []
+    for frame in frames:
+        results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        points.append(get_norm_hip_point(results) if results.pose_landmarks else (0.5, 0.5))
+    pose.close()
+    return points
+
+
+def run(model, frames, points, input_size):
+    """Hip depth per frame and the mean seconds per frame (one frame per forward pass, as live sources run)."""
+    model.infer_low_res(frames[:1], input_size) # Warm-up
+    values = []
+    start = time.perf_counter()
+    for frame, point in zip(frames, points):
+        depth = model.infer_low_res([frame], input_size)
+        values.append(float(model.sample_depth(depth, [[point]], frame.shape[:2])[0, 0]))
+    return np.array(values), (time.perf_counter() - start) / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--encoder', default='vits', choices=MODEL_CONFIGS)
+    parser.add_argument('--checkpoint', default=None, help="Default: the encoder's file in logic/checkpoints")
+    parser.add_argument('--video', default=None, help="Take the frames from this video")
+    parser.add_argument('--precisions', nargs='+', default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument('--frames', type=int, default=16)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=540)
+    parser.add_argument('--input-size', type=int, default=518)
+    args = parser.parse_args()
+
+    path = args.checkpoint or checkpoint_path(args.encoder)
+    if os.path.exists(path):
+        model = load_depth_model(args.encoder, 'cpu', path)
+    else:
+        print(f"{path} not found, using random weights (only the speed is meaningful)")
+        model = DepthAnythingV2(**MODEL_CONFIGS[args.encoder]).eval()
+
+    frames = read_frames(args.video, args.frames) if args.video else synthetic_frames(args.frames, args.width, args.height)
+    points = hip_points(frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, encoder {args.encoder}, "
+          f"input {args.input_size}, {torch.get_num_threads()} threads")
+
+    precisions = ['fp32'] + [precision for precision in args.precisions if precision != 'fp32']
+    print(f"{'precision':>9} {'ms/frame':>9} {'speedup':>8} {'hip depth err (mean/max)':>25} {'rel err':>8} {'Z shift err (mean/max)':>23}")
+    reference = None
+    for precision in precisions:
+        try:
+            model.set_precision(precision)
+        except RuntimeError as e:
+            print(f"{precision:>9} skipped: {e}")
+            continue
+        values, seconds = run(model, frames, points, args.input_size)
+        if reference is None:
+            reference = (values, seconds)
+        ref_values, ref_seconds = reference
+        error = np.abs(values - ref_values)
+        relative = error.mean() / max(np.abs(ref_values).mean(), 1e-12)
+        # The keypoints move by z_shift_offset(hip Z, first hip Z), so compare that too
+        shift_error = np.abs(z_shift_offset(values, values[0]) - z_shift_offset(ref_values, ref_values[0]))
+        print(f"{precision:>9} {seconds * 1000:>9.1f} {ref_seconds / seconds:>7.2f}x "
+              f"{error.mean():>12.4f} / {error.max():<10.4f} {relative:>7.2%} "
+              f"{shift_error.mean():>10.4f} / {shift_error.max():<10.4f}")
+    model.set_precision('fp32')
+
+
+if __name__ == '__main__':
+    main()
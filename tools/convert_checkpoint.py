@@ -0,0 +1,61 @@
+"""
+Converts Depth Anything V2 `.pth` checkpoints to `.safetensors`, which load
+memory-mapped without unpickling. The app uses the `.safetensors` file
+instead of the `.pth` next to it when it exists and the `safetensors`
+package is installed (`pip install safetensors`).
+
+Usage (from the project root):
+    python -m tools.convert_checkpoint logic/checkpoints/depth_anything_v2_vitl.pth
+    python -m tools.convert_checkpoint logic/checkpoints/*.pth --check
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+from logic.depth_model import load_state_dict
+
+
+def convert(pth_path, output_path):
+    """Writes the checkpoint's state dict as safetensors. Returns the number of tensors."""
+    from safetensors.torch import save_file
+    state_dict = load_state_dict(pth_path)
+    # safetensors only stores contiguous tensors
+    tensors = {name: tensor.contiguous() for name, tensor in state_dict.items()}
+    save_file(tensors, output_path, metadata={'source': os.path.basename(pth_path)})
+    return len(tensors)
+
+
+def check(pth_path, output_path):
+    """Whether both files hold the same tensors."""
+    original = load_state_dict(pth_path)
+    converted = load_state_dict(output_path)
+    return original.keys() == converted.keys() and all(torch.equal(original[name], converted[name]) for name in original)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help=".pth checkpoint files")
+    parser.add_argument('--check', action='store_true', help="Compare the converted tensors with the original ones")
+    args = parser.parse_args()
+
+    try:
+        import safetensors  # noqa: F401
+    except ImportError:
+        print("The safetensors package is needed: pip install safetensors")
+        sys.exit(1)
+
+    for pth_path in args.inputs:
+        output_path = os.path.splitext(pth_path)[0] + '.safetensors'
+        start = time.perf_counter()
+        count = convert(pth_path, output_path)
+        size_mb = os.path.getsize(output_path) / 2**20
+        print(f"{pth_path} -> {output_path}: {count} tensors, {size_mb:.1f} MB in {time.perf_counter() - start:.1f} s")
+        if args.check:
+            print("  identical" if check(pth_path, output_path) else "  MISMATCH")
+
+
+if __name__ == '__main__':
+    main()
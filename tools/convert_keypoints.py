@@ -0,0 +1,50 @@
+"""
+Converts keypoint files saved as JSON (array or JSON Lines) to the compact
+binary formats: `.npz` (one compressed file) or `.npy` + `.timestamps.npy`
++ `.meta.json` (memory-mappable, sliceable without loading everything).
+
+JSON files carry no timestamps; they are reconstructed from --fps.
+
+Usage (from the project root):
+    python -m tools.convert_keypoints outputs/keypoints/session.json
+    python -m tools.convert_keypoints outputs/keypoints/session.json --to npy --fps 30
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from logic.keypoint_io import load_keypoints, keypoints_to_array, save_keypoint_arrays, load_keypoint_arrays
+
+
+def convert(json_path, output_path, fps):
+    """Converts one JSON keypoints file. Returns the number of frames."""
+    frames = load_keypoints(json_path)
+    joints, has_z = keypoints_to_array(frames)
+    timestamps = np.arange(len(joints)) / fps
+    save_keypoint_arrays(output_path, joints, timestamps, has_z)
+    return len(joints)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help="JSON / JSONL keypoint files")
+    parser.add_argument('--to', choices=['npz', 'npy'], default='npz')
+    parser.add_argument('--fps', type=float, default=30.0, help="Frame rate used to reconstruct the timestamps")
+    args = parser.parse_args()
+
+    for json_path in args.inputs:
+        output_path = os.path.splitext(json_path)[0] + '.' + args.to
+        frames = convert(json_path, output_path, args.fps)
+
+        start = time.perf_counter()
+        load_keypoint_arrays(output_path)
+        load_ms = (time.perf_counter() - start) * 1000
+        json_size = os.path.getsize(json_path)
+        binary_size = os.path.getsize(output_path)
+        print(f"{json_path} -> {output_path}: {frames} frames, {json_size / 1024:.0f} KB -> {binary_size / 1024:.0f} KB, loads in {load_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
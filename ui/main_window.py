@@ -46,6 +46,8 @@ class MainWindow(QWidget):
     stop_worker_signal = pyqtSignal() 
     switch_mediaPipe_model_signal = pyqtSignal(int)
     switch_depth_model_signal = pyqtSignal(str)
+    warm_up_depth_model_signal = pyqtSignal()
+    switch_phone_stream_signal = pyqtSignal(str)
     def __init__(self):
         # --- Initialize the superclass ---
         super().__init__()
@@ -98,6 +100,15 @@ class MainWindow(QWidget):
         large_model_action.triggered.connect(self.set_large_model)
         depth_menu.addAction(large_model_action)
 
+        # Phone camera stream
+        phone_stream_menu = settings_menu.addMenu('Phone Stream')
+        snapshot_stream_action = QAction('Snapshots (shot.jpg)', self)
+        snapshot_stream_action.triggered.connect(self.set_snapshot_phone_stream)
+        phone_stream_menu.addAction(snapshot_stream_action)
+        mjpeg_stream_action = QAction('MJPEG Stream (video)', self)
+        mjpeg_stream_action.triggered.connect(self.set_mjpeg_phone_stream)
+        phone_stream_menu.addAction(mjpeg_stream_action)
+
         # --- Help Menu ---
         help_menu = self.menu_bar.addMenu('Help')
         about_action = QAction('About', self)
@@ -561,6 +572,7 @@ class MainWindow(QWidget):
         # Create a vertical layout for the media display and status label
         media_layout = QVBoxLayout()
         media_layout.addWidget(self.displayed_media_label, 1) # Give it stretch factor
+        media_layout.addWidget(self.status_label) # Shows the depth model's loading progress
 
         # Add the media layout to the main layout (it will be the left column)
         main_layout.addLayout(media_layout, 3) # The '3' gives it more horizontal stretch space
@@ -595,12 +607,15 @@ class MainWindow(QWidget):
         self.stop_worker_signal.connect(self.worker.stop) 
         self.switch_mediaPipe_model_signal.connect(self.worker.switch_mediapipe_model)
         self.switch_depth_model_signal.connect(self.worker.switch_depth_anything_model)
+        self.warm_up_depth_model_signal.connect(self.worker.warm_up_depth_model)
+        self.switch_phone_stream_signal.connect(self.worker.set_phone_stream_mode)
         
         # Connect signals from the worker back to this (main) thread's slots
         self.worker.image_finished.connect(self.on_image_processing_finished)
         self.worker.video_finished.connect(self.on_video_processing_finished)
         self.worker.new_frame_ready.connect(self.display_processed_image) # Connect new frame signal
         self.worker.error.connect(self.on_processing_error)
+        self.worker.depth_model_progress.connect(self.on_depth_model_progress)
 
         # Connect thread management signals
         self.thread.started.connect(lambda: print("Worker thread started."))
@@ -1102,6 +1117,15 @@ class MainWindow(QWidget):
         QMessageBox.critical(self, "Processing Error", error_message)
         self.set_ui_enabled(True)
 
+    def on_depth_model_progress(self, message, percent):
+        """Shows the depth model's background loading progress."""
+        if 0 <= percent < 100:
+            self.status_label.setText(f"{message}... {percent}%")
+        elif percent < 0:
+            self.status_label.setText(message) # Failed: stays until the next load
+        else:
+            self.status_label.setText("")
+
     def on_image_save_landmarks_changed(self, state):
         is_checked = state == Qt.CheckState.Checked.value
         self.img_landmarks_filename_label.setVisible(is_checked)
@@ -1225,6 +1249,7 @@ class MainWindow(QWidget):
         self.on_3d_video_send_keypoints_changed(self.vid_3d_send_keypoints_cb.checkState().value)
 
     def show_3d_depth_video_options(self):
+        self.warm_up_depth_model_signal.emit() # Start loading the depth model in the background
         self.vid_3d_depth_browse_button.show()
         self.vid_3d_depth_disp_depth_map_ch.show()
         self.vid_3d_depth_use_depth_model_cb.show()
@@ -1240,6 +1265,7 @@ class MainWindow(QWidget):
         self.on_3d_depth_video_send_keypoints_changed(self.vid_3d_send_keypoints_cb.checkState().value)
 
     def show_3d_depth_phone_options(self):
+        self.warm_up_depth_model_signal.emit() # Start loading the depth model in the background
         self.phone_3d_depth_disp_depth_map_ch.show()
         self.phone_3d_depth_use_depth_model_cb.show()
         self.phone_3d_depth_ip_label.show()
@@ -1572,6 +1598,7 @@ class MainWindow(QWidget):
             self.thread.wait() # Wait again after forced termination
         
         print("Thread stopped.")
+        self.worker.close() # Stops the keypoint server, which lives across processing runs
         event.accept()
 
     def on_3d_video_save_keypoints_changed(self, state):
@@ -1732,6 +1759,14 @@ class MainWindow(QWidget):
     def set_large_model(self):
         """Switch to large model"""
         self.switch_depth_model_signal.emit('vitl')
+
+    def set_snapshot_phone_stream(self):
+        """Poll single snapshots from the phone camera"""
+        self.switch_phone_stream_signal.emit('snapshot')
+
+    def set_mjpeg_phone_stream(self):
+        """Read the phone camera's MJPEG stream"""
+        self.switch_phone_stream_signal.emit('mjpeg')
         
     # --- Dialog Methods ---
     def show_about_dialog(self):